@@ -35,12 +35,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'drive_safe',
     'rest_framework',
     'drf_yasg',
 ]
 
 MIDDLEWARE = [
+    'drive_safe.middleware.MetricsMiddleware',
+    'drive_safe.middleware.ProfilingMiddleware',
+    'drive_safe.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +77,12 @@ WSGI_APPLICATION = 'Driver.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# Seconds a worker keeps its database connections open between requests, 0
+# reconnects on every request. Behind a pgbouncer in transaction pooling mode
+# also set 'DISABLE_SERVER_SIDE_CURSORS': True on the aliases, streamed lists
+# read with .iterator().
+DRIVE_SAFE_CONN_MAX_AGE = 600
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -80,9 +90,62 @@ DATABASES = {
         'USER': 'postgres',
         'PASSWORD': 'postgres',
         'HOST': '127.0.0.1',
-    }
+        'CONN_MAX_AGE': DRIVE_SAFE_CONN_MAX_AGE,
+    },
+    # streaming replica of default. Tests get a separate database that
+    # nothing replicates to, a replica lagging behind every write
+    'replica': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'drive_safe',
+        'USER': 'postgres',
+        'PASSWORD': 'postgres',
+        'HOST': '127.0.0.1',
+        'CONN_MAX_AGE': DRIVE_SAFE_CONN_MAX_AGE,
+        'TEST': {
+            'NAME': 'test_drive_safe_replica',
+        },
+    },
+}
+
+# Reads are spread over the replicas, writes go to default, see drive_safe.routers
+DATABASE_ROUTERS = ['drive_safe.routers.ReplicaRouter']
+DRIVE_SAFE_REPLICAS = ['replica']
+
+# Seconds after a write during which the client reads from default
+DRIVE_SAFE_READ_YOUR_WRITES_SECONDS = 10
+
+# Check persistent connections idle for more than DRIVE_SAFE_CONN_HEALTH_CHECK_IDLE
+# seconds with a ping at the start of a request and reconnect the ones closed
+# by the server, a pooler or a failover. Connections of busy workers are not
+# pinged.
+DRIVE_SAFE_CONN_HEALTH_CHECKS = True
+DRIVE_SAFE_CONN_HEALTH_CHECK_IDLE = 30
+
+# Worker warm-up run by Driver/wsgi.py, see drive_safe.warmup. The answer keys
+# of this many most passed advice tests are loaded in advance.
+DRIVE_SAFE_WARM_UP = True
+DRIVE_SAFE_WARM_UP_ANSWER_KEYS = 100
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # serialized responses of the advice endpoints, see drive_safe.cache
+    'drive_safe': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'drive-safe',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
 }
 
+DRIVE_SAFE_CACHE_ALIAS = 'drive_safe'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -118,3 +181,77 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # FastJSONRenderer uses orjson when it is installed (pip install orjson)
+    'DEFAULT_RENDERER_CLASSES': (
+        'drive_safe.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'drive_safe.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Upper bound for the ?page_size= query parameter of list endpoints
+DRIVE_SAFE_MAX_PAGE_SIZE = 500
+
+# Upper bound for the number of ids of advices/?ids= batch requests
+DRIVE_SAFE_MAX_BATCH_IDS = 100
+
+# Upper bound for the number of tag ids of advices/?tags= filters
+DRIVE_SAFE_MAX_FILTER_TAGS = 20
+
+# Rows fetched from the server-side cursor and serialized at a time by
+# streamed list responses (?stream=true)
+DRIVE_SAFE_STREAM_CHUNK_SIZE = 2000
+
+# Maximum number of changed or deleted rows returned by one sync/ response
+DRIVE_SAFE_SYNC_LIMIT = 1000
+
+# Number of test answer keys kept in memory by every worker process and the
+# seconds after which they are reloaded. Edits reach other workers at once
+# only when the drive_safe cache is shared, otherwise after the TTL.
+DRIVE_SAFE_ANSWER_KEY_CACHE_SIZE = 1024
+DRIVE_SAFE_ANSWER_KEY_TTL = 300
+
+# Cache-Control directives of the read endpoints, see drive_safe.conditional.
+# Responses carry ETags, so shared caches can revalidate them cheaply.
+DRIVE_SAFE_CACHE_CONTROL = {
+    'advices': {'public': True, 'max_age': 60, 's_maxage': 300},
+    'forum': {'public': True, 'max_age': 0, 's_maxage': 10},
+    'schema': {'public': True, 'max_age': 300},
+}
+
+# PostgreSQL text search configuration of advice and forum search. Stock
+# PostgreSQL has no Polish one: after creating a 'polish' configuration from
+# a pl_PL ispell dictionary set it here and run manage.py update_search_vectors.
+DRIVE_SAFE_SEARCH_CONFIG = 'simple'
+
+# Seconds after which a worker rebuilds its leaderboard ranking from the database
+DRIVE_SAFE_LEADERBOARD_REBUILD_INTERVAL = 300
+
+# OpenAPI schema files written by manage.py generate_schema, see drive_safe.schema.
+# The swagger and redoc pages load the schema from swagger.json.
+DRIVE_SAFE_SCHEMA_DIR = os.path.join(BASE_DIR, 'schema')
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# Request metrics exposed at /metrics/, see drive_safe.metrics. Latency
+# histogram buckets in seconds and an optional bearer token for scraping.
+DRIVE_SAFE_METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DRIVE_SAFE_METRICS_TOKEN = None
+
+# Request profiling, see drive_safe.middleware.ProfilingMiddleware. When enabled,
+# requests with the token in the X-Drive-Safe-Profile header and a random
+# sample of the others are profiled. Keep the sample rate low in production.
+DRIVE_SAFE_PROFILING = False
+DRIVE_SAFE_PROFILING_TOKEN = None
+DRIVE_SAFE_PROFILING_SAMPLE_RATE = 0.0
+DRIVE_SAFE_PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
@@ -20,17 +20,10 @@ from drive_safe.views import *
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from drive_safe.schema import api_info
 
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
@@ -41,15 +34,21 @@ urlpatterns = [
     url(r'^advices/(?P<advice_id>(\d)+)$', AdviceDetail.as_view(), name="advice_detail"),
     url(r'^advices/tag/(?P<tag_id>(\d)+)$', AdviceTagList.as_view()),
     url(r'^advices/test/(?P<advice_id>(\d)+)$', AdviceTest.as_view()),
+    url(r'^tags/$', TagList.as_view(), name="tags"),
     url(r'^forum_questions/$', ForumQuestionList.as_view(), name="forum_questions"),
     url(r'^forum_questions/(?P<question_id>(\d)+)$', ForumQuestionDetail.as_view(), name='forum_question_detail'),
+    url(r'^forum_questions/(?P<question_id>(\d)+)/thread$', ForumThread.as_view(), name='forum_thread'),
     url(r'^forum_answers/$', ForumAnswersList.as_view(), name="forum_answers"),
     url(r'^forum_answers/question/(?P<question_id>(\d)+)$', ForumAnswersForQuestion.as_view()),
     url(r'^forum_answers/(?P<answer_id>(\d)+)$', ForumAnswersDetail.as_view()),
+    url(r'^search/$', Search.as_view(), name="search"),
+    url(r'^sync/$', Sync.as_view(), name="sync"),
     url(r'^new_user/$', UserRegistration.as_view(), name="new_user"),
     url(r'^user_info/(?P<user_id>(\d)+)$', GetUserInfo.as_view()),
+    url(r'^leaderboard/$', Leaderboard.as_view(), name="leaderboard"),
+    url(r'^metrics/$', metrics, name="metrics"),
     url(r'^test_check/(?P<user_id>(\d)+)/(?P<advice_id>(\d)+)$', TestCheck.as_view()),
-    url(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    url(r'^swagger(?P<format>\.json|\.yaml)$', api_schema, name='schema-json'),
     url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     url(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
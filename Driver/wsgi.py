@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Driver.settings')
 
 application = get_wsgi_application()
+
+from drive_safe.warmup import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1 @@
+default_app_config = 'drive_safe.apps.DriveSafeConfig'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DriveSafeConfig(AppConfig):
     name = 'drive_safe'
+
+    def ready(self):
+        import drive_safe.signals  # noqa: F401
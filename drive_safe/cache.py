@@ -0,0 +1,166 @@
+"""
+Read-through cache of serialized responses of the hot advice endpoints.
+
+Entries live in the cache configured under DRIVE_SAFE_CACHE_ALIAS, whose
+TIMEOUT and MAX_ENTRIES options give the TTL and the size bound. They are
+invalidated by the model signals in drive_safe.signals once the transaction
+commits: dropped earlier, a concurrent request could cache the old rows
+again for the whole TIMEOUT. For DRIVE_SAFE_READ_YOUR_WRITES_SECONDS
+after an invalidation misses of the invalidated keys are computed on the
+primary database, a lagging replica would return the old rows. The default
+local-memory backend is per process, so deployments running several
+worker processes should point the alias at a shared backend (memcached,
+redis) to make invalidation reach every worker.
+"""
+import hashlib
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from drive_safe.routers import use_primary
+
+ADVICE_LIST_GENERATION_KEY = 'advice_list:generation'
+FORUM_QUESTIONS_VERSION_KEY = 'forum_questions:version'
+FORUM_ANSWERS_VERSION_KEY = 'forum_answers:version'
+TAG_LIST_KEY = 'tag_list'
+
+
+def get_cache():
+    return caches[getattr(settings, 'DRIVE_SAFE_CACHE_ALIAS', 'drive_safe')]
+
+
+def cached(key, compute, written_key=None):
+    """
+    Return cached data stored under key, computing and storing it on a miss.
+    written_key is the key invalidated for it, key by default.
+    """
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        with fresh_reads(written_key or key):
+            data = compute()
+        cache.set(key, data)
+    return data
+
+
+def recent_write_key(key):
+    return 'recent_write:%s' % key
+
+
+def mark_written(keys):
+    """
+    Record a committed write invalidating keys, see fresh_reads().
+    """
+    get_cache().set_many(dict.fromkeys(map(recent_write_key, keys), True),
+                         getattr(settings, 'DRIVE_SAFE_READ_YOUR_WRITES_SECONDS', 10))
+
+
+@contextmanager
+def fresh_reads(key):
+    """
+    Send the reads to the primary database if key was invalidated in the
+    last DRIVE_SAFE_READ_YOUR_WRITES_SECONDS, so data cached after an
+    invalidation doesn't come from a replica that hasn't replayed it yet.
+    Other keys keep reading the replicas.
+    """
+    if get_cache().get(recent_write_key(key)):
+        with use_primary():
+            yield
+    else:
+        yield
+
+
+def advice_key(advice_id):
+    return 'advice:%d' % int(advice_id)
+
+
+def advice_test_key(advice_id):
+    return 'advice_test:%d' % int(advice_id)
+
+
+def state_key(key):
+    """
+    Key of the conditional GET state of the response cached under key.
+    """
+    return '%s:state' % key
+
+
+def advice_list_key(request):
+    """
+    Key of a page of an advice list. Pages can't be enumerated, so they
+    are grouped under a generation token that is replaced on invalidation.
+    """
+    cache = get_cache()
+    generation = cache.get(ADVICE_LIST_GENERATION_KEY)
+    if generation is None:
+        cache.add(ADVICE_LIST_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(ADVICE_LIST_GENERATION_KEY, '')
+    url = request.build_absolute_uri().encode('utf-8')
+    return 'advice_list:%s:%s' % (generation, hashlib.md5(url).hexdigest())
+
+
+def invalidate_advice_details(advice_ids):
+    """
+    Drop cached details of given advices.
+    """
+    keys = [advice_key(advice_id) for advice_id in advice_ids]
+    keys += [state_key(key) for key in keys]
+
+    def invalidate():
+        get_cache().delete_many(keys)
+        mark_written(keys)
+    transaction.on_commit(invalidate)
+
+
+def invalidate_advices(advice_ids):
+    """
+    Drop cached details of given advices and every cached advice list page.
+    """
+    invalidate_advice_details(advice_ids)
+
+    def invalidate():
+        get_cache().set(ADVICE_LIST_GENERATION_KEY, uuid.uuid4().hex, None)
+        mark_written([ADVICE_LIST_GENERATION_KEY])
+    transaction.on_commit(invalidate)
+
+
+def invalidate_tags():
+    """
+    Drop the cached tag list with advice counts.
+    """
+    def invalidate():
+        get_cache().delete(TAG_LIST_KEY)
+        mark_written([TAG_LIST_KEY])
+    transaction.on_commit(invalidate)
+
+
+def invalidate_advice_test(advice_id):
+    keys = [advice_test_key(advice_id), state_key(advice_test_key(advice_id))]
+
+    def invalidate():
+        get_cache().delete_many(keys)
+        mark_written(keys)
+    transaction.on_commit(invalidate)
+
+
+def get_collection_version(key):
+    """
+    Return (version stamp, time of the last change or None) of a collection,
+    replaced by invalidate_collection when a change of its rows commits.
+    """
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = (uuid.uuid4().hex, None)
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_collection(key):
+    transaction.on_commit(
+        lambda: get_cache().set(key, (uuid.uuid4().hex, time.time()), None))
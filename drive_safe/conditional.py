@@ -0,0 +1,109 @@
+"""
+Conditional GET (ETag / Last-Modified) and Cache-Control support for the
+read endpoints.
+
+Validators are computed from the updated_at columns with one small query,
+or for the large forum collections from version stamps in the cache, and
+never from the rendered body. Collections only get an ETag: deleting a row
+does not move their latest updated_at, so Last-Modified would let clients
+keep deleted rows.
+"""
+import hashlib
+import time
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from drive_safe.cache import get_collection_version
+
+
+def queryset_state(queryset):
+    """
+    Return state of a collection: number of rows and the latest update.
+    """
+    state = queryset.order_by().aggregate(count=Count('id'),
+                                          updated_at=Max('updated_at'))
+    return (state['count'], state['updated_at']), None
+
+
+def collection_state(key, model):
+    """
+    Return state of a collection of model rows from its version stamp,
+    without a query. None while a replica the rows are read from could
+    still miss the last change: its old rows would get the new ETag.
+    """
+    version, changed_at = get_collection_version(key)
+    if (changed_at is not None and router.db_for_read(model) != DEFAULT_DB_ALIAS
+            and time.time() - changed_at < getattr(settings, 'DRIVE_SAFE_READ_YOUR_WRITES_SECONDS', 10)):
+        return None
+    return (version,), None
+
+
+def object_state(queryset, pk, *fields):
+    """
+    Return state of a single object or None if it does not exist. Fields
+    changing without updated_at are added to the ETag.
+    """
+    row = queryset.filter(pk=pk).values_list('updated_at', *fields).first()
+    if row is None:
+        return None
+    return (pk,) + row, row[0]
+
+
+def object_related_state(queryset, pk, related_model, field):
+    """
+    Return state of a single object and of the collection of related_model
+    rows pointing at it with field, or None if the object does not exist.
+    Uses one query.
+    """
+    related = related_model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    row = queryset.filter(pk=pk).annotate(
+        related_count=Subquery(related.annotate(count=Count('id')).values('count'),
+                               output_field=IntegerField()),
+        related_updated_at=Subquery(related.annotate(latest=Max('updated_at')).values('latest')),
+    ).values_list('updated_at', 'related_count', 'related_updated_at').first()
+    if row is None:
+        return None
+    updated_at, count, related_updated_at = row
+    return ((pk, updated_at), (count or 0, related_updated_at)), None
+
+
+def conditional_get(method):
+    """
+    Decorate a GET handler of a view that defines get_state(request,
+    **kwargs) returning (etag parts, last modified datetime or None) or
+    None. Answers 304 Not Modified when the client validators still match
+    and adds ETag, Last-Modified and the Cache-Control headers configured
+    for the view's cache_control profile in DRIVE_SAFE_CACHE_CONTROL.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        state = self.get_state(request, **kwargs)
+        if state is None:
+            return method(self, request, *args, **kwargs)
+
+        parts, last_modified = state
+        # the same state renders differently for other URLs and formats
+        key = repr((request.get_full_path(), request.META.get('HTTP_ACCEPT'),
+                    parts))
+        etag = quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+        timestamp = last_modified and timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=timestamp)
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+            profiles = getattr(settings, 'DRIVE_SAFE_CACHE_CONTROL', {})
+            profile = profiles.get(getattr(self, 'cache_control', None), {})
+            patch_cache_control(response, **profile)
+        return response
+    return wrapper
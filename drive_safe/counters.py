@@ -0,0 +1,79 @@
+"""
+Denormalized counters: Advice.pass_count, ForumQuestion.answer_count and
+ForumQuestion.last_activity.
+
+They are changed with F() expressions by the signal handlers, inside the
+transaction of the change that caused them. Advice.pass_count changes with
+every passed test, so it leaves updated_at alone: a pass only drops the
+cached detail of its advice, and the advice lists put the current counts
+over their cached pages. Rows inserted or deleted without signals (bulk
+queries, raw SQL) leave them drifting until reconciled.
+"""
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from drive_safe.cache import (FORUM_QUESTIONS_VERSION_KEY, invalidate_advice_details,
+                              invalidate_collection)
+from drive_safe.models import Advice, ForumAnswers, ForumQuestion, TestPassed
+
+
+def change_pass_count(advice_id, delta):
+    Advice.objects.filter(pk=advice_id).update(pass_count=F('pass_count') + delta)
+    invalidate_advice_details([advice_id])
+
+
+def change_answer_count(question_id, delta):
+    now = timezone.now()
+    updates = {'answer_count': F('answer_count') + delta, 'updated_at': now}
+    if delta > 0:
+        updates['last_activity'] = now
+    ForumQuestion.objects.filter(pk=question_id).update(**updates)
+    invalidate_collection(FORUM_QUESTIONS_VERSION_KEY)
+
+
+def record_activity(question_id):
+    now = timezone.now()
+    ForumQuestion.objects.filter(pk=question_id).update(last_activity=now, updated_at=now)
+    invalidate_collection(FORUM_QUESTIONS_VERSION_KEY)
+
+
+def related_count(model, field):
+    """
+    Subquery counting rows of model pointing with field at the outer row.
+    """
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_pass_counts(queryset):
+    """
+    Recount passes of the advices in queryset, return ids of fixed advices.
+    """
+    actual = related_count(TestPassed, 'advice')
+    advice_ids = list(queryset.annotate(actual=actual).exclude(
+        pass_count=F('actual')).values_list('pk', flat=True))
+    if advice_ids:
+        Advice.objects.filter(pk__in=advice_ids).update(pass_count=actual)
+        invalidate_advice_details(advice_ids)
+    return advice_ids
+
+
+def reconcile_answer_counts(queryset):
+    """
+    Recount answers of the forum questions in queryset and move their last
+    activity up to the latest answer, return ids of fixed questions.
+    """
+    actual = related_count(ForumAnswers, 'question')
+    latest = Subquery(ForumAnswers.objects.filter(question=OuterRef('pk')).order_by().values(
+        'question').annotate(latest=Max('updated_at')).values('latest'))
+    question_ids = list(queryset.annotate(actual=actual, latest=latest).filter(
+        ~Q(answer_count=F('actual')) | Q(last_activity__lt=F('latest'))
+    ).values_list('pk', flat=True))
+    if question_ids:
+        ForumQuestion.objects.filter(pk__in=question_ids).update(
+            answer_count=actual, last_activity=Greatest('last_activity', latest),
+            updated_at=timezone.now())
+        invalidate_collection(FORUM_QUESTIONS_VERSION_KEY)
+    return question_ids
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db.models import Count
+from django.utils.dateparse import parse_date
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from drive_safe.models import Advice
+
+
+class ForumFilterBackend(BaseFilterBackend):
+    """
+    Filter by ids of the relations listed in the view's filter_fields and by
+    a date_added range given with date_from and date_to (inclusive,
+    YYYY-MM-DD). Every filter has a composite index ending with
+    (date_added, id), so filtered pages are index range scans.
+    """
+
+    date_params = (
+        ('date_from', 'date_added__gte'),
+        ('date_to', 'date_added__lte'),
+    )
+
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        for name in getattr(view, 'filter_fields', ()):
+            value = request.query_params.get(name)
+            if value is not None:
+                try:
+                    filters[name] = int(value)
+                except ValueError:
+                    raise ValidationError({name: 'A valid integer is required.'})
+        for param, lookup in self.date_params:
+            value = request.query_params.get(param)
+            if value is not None:
+                try:
+                    filters[lookup] = parse_date(value)
+                except ValueError:
+                    filters[lookup] = None
+                if filters[lookup] is None:
+                    raise ValidationError({param: 'A valid date (YYYY-MM-DD) is required.'})
+        return queryset.filter(**filters)
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        fields = [
+            coreapi.Field(name=name, required=False, location='query',
+                          schema=coreschema.Integer(title=name.capitalize(),
+                                                    description='Id of the %s.' % name))
+            for name in getattr(view, 'filter_fields', ())
+        ]
+        fields += [
+            coreapi.Field(name=param, required=False, location='query',
+                          schema=coreschema.String(title=param.replace('_', ' ').capitalize(),
+                                                   description='Date added (YYYY-MM-DD), inclusive.'))
+            for param, _ in self.date_params
+        ]
+        return fields
+
+
+class AdviceTagFilterBackend(BaseFilterBackend):
+    """
+    Filter advices by tag ids given as ?tags=1,2,3, keeping the advices with
+    any of the tags (match=any, the default) or with all of them
+    (match=all). Both are one semi-join over the Advice.tags join table,
+    read from its (tags_id, advice_id) index.
+    """
+
+    match_choices = ('any', 'all')
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get('tags')
+        if value is None:
+            return queryset
+        try:
+            tag_ids = sorted({int(tag_id) for tag_id in value.split(',')})
+        except ValueError:
+            raise ValidationError({'tags': 'A comma separated list of integers is required.'})
+        max_tags = getattr(settings, 'DRIVE_SAFE_MAX_FILTER_TAGS', 20)
+        if len(tag_ids) > max_tags:
+            raise ValidationError({'tags': 'At most %d tags can be given.' % max_tags})
+        match = request.query_params.get('match', 'any')
+        if match not in self.match_choices:
+            raise ValidationError({'match': 'Choose one of: %s.' % ', '.join(self.match_choices)})
+
+        links = Advice.tags.through.objects.filter(tags_id__in=tag_ids).order_by()
+        if match == 'all' and len(tag_ids) > 1:
+            # (advice_id, tags_id) is unique, so an advice with every tag has len(tag_ids) links
+            links = links.values('advice_id').annotate(matched=Count('tags_id')).filter(
+                matched=len(tag_ids))
+        return queryset.filter(pk__in=links.values('advice_id'))
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(name='tags', required=False, location='query',
+                          schema=coreschema.String(title='Tags',
+                                                   description='Comma separated tag ids.')),
+            coreapi.Field(name='match', required=False, location='query',
+                          schema=coreschema.Enum(self.match_choices, title='Match',
+                                                 description='Keep advices with any (default) or '
+                                                             'all of the tags.')),
+        ]
@@ -0,0 +1,149 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from drive_safe.cache import fresh_reads, get_cache, mark_written
+from drive_safe.models import TestQuestions
+
+
+class GradingError(Exception):
+    """
+    Raised when a submission can't be graded against the answer key.
+    """
+
+
+class AnswerKeyCache:
+    """
+    Per-process LRU cache of answer keys stored as compact tuples of
+    (question id, upper-cased correct answer) pairs.
+
+    Every entry carries the version stamp of its advice. Stamps are kept in
+    the drive_safe cache and replaced when a test question changes, so with
+    a shared cache backend an entry loaded by any worker process is dropped
+    on its next lookup. Stamps and entries also expire after ttl seconds,
+    which bounds staleness when the backend is per process (LocMemCache).
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, advice_id, version):
+        with self._lock:
+            entry = self._entries.get(advice_id)
+            if entry is None or not entry[0] == version:
+                return None
+            if time.monotonic() > entry[2]:
+                del self._entries[advice_id]
+                return None
+            self._entries.move_to_end(advice_id)
+            return entry[1]
+
+    def set(self, advice_id, version, answer_key):
+        with self._lock:
+            self._entries[advice_id] = (version, answer_key, time.monotonic() + self.ttl)
+            self._entries.move_to_end(advice_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, advice_id):
+        with self._lock:
+            self._entries.pop(advice_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+answer_key_cache = AnswerKeyCache(
+    getattr(settings, 'DRIVE_SAFE_ANSWER_KEY_CACHE_SIZE', 1024),
+    getattr(settings, 'DRIVE_SAFE_ANSWER_KEY_TTL', 300))
+
+
+def answer_key_version_key(advice_id):
+    return 'answer_key_version:%d' % advice_id
+
+
+def get_answer_key_version(advice_id):
+    cache = get_cache()
+    key = answer_key_version_key(advice_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, answer_key_cache.ttl):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_answer_key(advice_id):
+    """
+    Replace the version stamp of the answer key when the current transaction
+    commits. Replaced earlier, a concurrent submission could store the
+    uncommitted old questions under the new stamp.
+    """
+    def replace_version():
+        get_cache().set(answer_key_version_key(advice_id), uuid.uuid4().hex, answer_key_cache.ttl)
+        answer_key_cache.evict(advice_id)
+        mark_written([answer_key_version_key(advice_id)])
+    transaction.on_commit(replace_version)
+
+
+def load_answer_key(advice):
+    """
+    Return the answer key of the advice test as a dict mapping question id
+    to the upper-cased correct answer. On a cache miss uses a single query.
+    """
+    version = get_answer_key_version(advice.pk)
+    answer_key = answer_key_cache.get(advice.pk, version)
+    if answer_key is None:
+        questions = TestQuestions.objects.filter(advice=advice)
+        with fresh_reads(answer_key_version_key(advice.pk)):
+            answer_key = tuple(
+                (question_id, correct_answer.upper())
+                for question_id, correct_answer in questions.values_list(
+                    'id', 'correct_answer')
+            )
+        answer_key_cache.set(advice.pk, version, answer_key)
+    return dict(answer_key)
+
+
+def preload_answer_keys(advice_ids):
+    """
+    Load answer keys of the advice tests into the cache with one query.
+    """
+    answer_keys = {advice_id: [] for advice_id in advice_ids}
+    versions = {advice_id: get_answer_key_version(advice_id) for advice_id in answer_keys}
+    questions = TestQuestions.objects.filter(advice__in=answer_keys).order_by('id')
+    for advice_id, question_id, correct_answer in questions.values_list(
+            'advice', 'id', 'correct_answer'):
+        answer_keys[advice_id].append((question_id, correct_answer.upper()))
+    for advice_id, answer_key in answer_keys.items():
+        answer_key_cache.set(advice_id, versions[advice_id], tuple(answer_key))
+
+
+def grade(answer_key, answers):
+    """
+    Grade validated TestAnswerSerializer data in memory.
+    Return list of ids of incorrectly answered questions.
+    """
+    if not len(answer_key) == len(answers):
+        raise GradingError('Wrong number of answers')
+
+    incorrect_answers = []
+    checked_questions = set()
+    for element in answers:
+        question_id = element['question_id']
+        # every question of the test has to be answered exactly once
+        if (question_id not in answer_key
+                or question_id in checked_questions):
+            raise GradingError('Question does not belong to the test')
+        checked_questions.add(question_id)
+        if not answer_key[question_id] == element['question_answer'].upper():
+            incorrect_answers.append(question_id)
+    return incorrect_answers
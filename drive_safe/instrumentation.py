@@ -0,0 +1,49 @@
+"""
+Light-weight recording of SQL queries through database execute wrappers.
+
+Unlike CaptureQueriesContext it doesn't force debug cursors, so it is cheap
+enough to run on every request.
+"""
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+class QueryRecorder:
+    """
+    Context manager counting queries run on all database connections of the
+    current thread and their total time in seconds. With record_sql=True
+    it also keeps every statement with its duration.
+    """
+
+    def __init__(self, record_sql=False):
+        self.record_sql = record_sql
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.record_sql:
+                self.statements.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'duration': duration,
+                })
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
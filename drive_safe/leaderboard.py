@@ -0,0 +1,114 @@
+"""
+Ranking of users by their UserScore for the leaderboard.
+
+Every worker process keeps a Fenwick (binary indexed) tree counting users
+per score value. A rank is one plus the number of users with a higher
+score, read from the tree in O(log n) of the score range instead of
+counting rows. TestCheck and UserRegistration update the tree when they
+change scores. The tree is rebuilt from one GROUP BY query after
+DRIVE_SAFE_LEADERBOARD_REBUILD_INTERVAL seconds, which picks up changes
+made by other processes.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from drive_safe.models import UserScore
+
+# range of UserScore.score, a SmallIntegerField
+MIN_SCORE = -32768
+MAX_SCORE = 32767
+
+
+class ScoreRanking:
+
+    def __init__(self, rebuild_interval):
+        self.rebuild_interval = rebuild_interval
+        self._size = MAX_SCORE - MIN_SCORE + 1
+        self._tree = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index(score):
+        # higher scores get lower indices, so a prefix sum counts users
+        # with a score higher than or equal to the score at its end
+        return MAX_SCORE - min(max(score, MIN_SCORE), MAX_SCORE) + 1
+
+    def _add(self, score, users):
+        index = self._index(score)
+        while index <= self._size:
+            self._tree[index] += users
+            index += index & -index
+
+    def _count_from_top(self, index):
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _build(self):
+        tree = [0] * (self._size + 1)
+        users_per_score = UserScore.objects.order_by().values_list(
+            'score').annotate(users=Count('id'))
+        for score, users in users_per_score:
+            tree[self._index(score)] += users
+        # linear-time Fenwick tree construction
+        for index in range(1, self._size + 1):
+            parent = index + (index & -index)
+            if parent <= self._size:
+                tree[parent] += tree[index]
+        return tree
+
+    def _ensure_built(self):
+        if (self._tree is None
+                or time.monotonic() - self._built_at > self.rebuild_interval):
+            self._tree = self._build()
+            self._built_at = time.monotonic()
+
+    def rank(self, score):
+        """
+        Return 1 + number of users with a higher score.
+        """
+        with self._lock:
+            self._ensure_built()
+            return self._count_from_top(self._index(score) - 1) + 1
+
+    def score_added(self, score):
+        self.score_changed(None, score)
+
+    def score_changed(self, old_score, new_score):
+        with self._lock:
+            if self._tree is None:
+                # the next lookup builds the tree from the database
+                return
+            if old_score is not None:
+                self._add(old_score, -1)
+            self._add(new_score, 1)
+
+    def reset(self):
+        with self._lock:
+            self._tree = None
+
+
+score_ranking = ScoreRanking(
+    getattr(settings, 'DRIVE_SAFE_LEADERBOARD_REBUILD_INTERVAL', 300))
+
+
+def get_top_scores(limit):
+    """
+    Return the best `limit` UserScore rows with users, read through the
+    (score, user) index, and their ranks.
+    """
+    top_scores = list(UserScore.objects.select_related('user').order_by(
+        '-score', 'user_id')[:limit])
+    ranks = []
+    for position, user_score in enumerate(top_scores):
+        if position and user_score.score == top_scores[position - 1].score:
+            ranks.append(ranks[-1])
+        else:
+            ranks.append(position + 1)
+    return list(zip(top_scores, ranks))
@@ -0,0 +1,199 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, get_resolver
+from django.utils import timezone
+from django.utils.regex_helper import normalize
+
+from drive_safe.instrumentation import QueryRecorder
+from drive_safe.models import Advice, ForumAnswers, ForumQuestion, Tags, UserScore
+
+# query parameters needed by endpoints to do real work
+QUERY_PARAMS = {
+    'search': {'q': 'droga'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Drive every URL of the API through the Django test client and report '
+            'p50/p95/p99 latency, queries per request and response size as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Unmeasured requests sent to every endpoint first.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Earlier result file to print latency changes against.')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Only benchmark endpoints whose name contains this text.')
+        parser.add_argument('--host', default='localhost',
+                            help='Host name sent with requests, must be allowed by ALLOWED_HOSTS.')
+        parser.add_argument('--include-writes', action='store_true',
+                            help='Also benchmark endpoints that create rows (user registration).')
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME=options['host'])
+        results = {}
+        for name, method, path, data in self.get_requests(options):
+            self.stdout.write('%s %s' % (method, path))
+            for _ in range(options['warmup']):
+                self.send(client, method, path, data)
+            results[name] = self.measure(client, method, path, data, options['iterations'])
+
+        report = {
+            'meta': self.get_meta(options),
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        self.print_report(results, options['compare'])
+        self.stdout.write('Results written to %s' % options['output'])
+
+    def get_requests(self, options):
+        """
+        Yield (name, method, path, data) of a request for every URL pattern.
+        """
+        kwargs = self.get_sample_kwargs()
+        for pattern in get_resolver().url_patterns:
+            # included URL configurations (admin) are not part of the API
+            if not isinstance(pattern, URLPattern):
+                continue
+            name = pattern.name or pattern.lookup_str
+            if options['endpoint'] and not any(part in name for part in options['endpoint']):
+                continue
+            format_string, params = normalize(pattern.pattern.regex.pattern)[0]
+            if any(kwargs.get(param) is None for param in params):
+                self.stderr.write('Skipping %s, no sample data' % name)
+                continue
+            path = '/' + format_string % kwargs
+            view_class = getattr(pattern.callback, 'view_class', None)
+
+            if view_class is None or hasattr(view_class, 'get'):
+                yield name, 'GET', path, QUERY_PARAMS.get(name)
+            elif view_class.__name__ == 'TestCheck':
+                yield name, 'POST', path, self.get_failing_answers(kwargs['advice_id'])
+            elif view_class.__name__ == 'UserRegistration' and options['include_writes']:
+                yield name, 'POST', path, None
+
+    @staticmethod
+    def get_sample_kwargs():
+        advice = Advice.objects.annotate(questions=Count('testquestions')).filter(
+            questions__gt=0).order_by('id').first() or Advice.objects.order_by('id').first()
+        return {
+            'advice_id': advice and advice.id,
+            'tag_id': Tags.objects.values_list('id', flat=True).order_by('id').first(),
+            'question_id': ForumQuestion.objects.values_list('id', flat=True).order_by('id').first(),
+            'answer_id': ForumAnswers.objects.values_list('id', flat=True).order_by('id').first(),
+            'user_id': UserScore.objects.values_list('user_id', flat=True).order_by('id').first(),
+            'format': '.json',
+        }
+
+    @staticmethod
+    def get_failing_answers(advice_id):
+        # wrong answers are graded without writing anything
+        return [
+            {'question_id': question_id, 'question_answer': 'x'}
+            for question_id in Advice.objects.get(pk=advice_id).testquestions_set.values_list(
+                'id', flat=True)
+        ]
+
+    @staticmethod
+    def send(client, method, path, data):
+        if method == 'GET':
+            return client.get(path, data)
+        if data is None:
+            data = {'username': 'benchmark-%s' % uuid.uuid4().hex, 'password': uuid.uuid4().hex}
+        return client.post(path, json.dumps(data), content_type='application/json')
+
+    def measure(self, client, method, path, data, iterations):
+        latencies = []
+        queries = []
+        sizes = []
+        status_codes = set()
+        for _ in range(iterations):
+            with QueryRecorder() as recorder:
+                start = time.perf_counter()
+                response = self.send(client, method, path, data)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(recorder.count)
+            sizes.append(size)
+            status_codes.add(response.status_code)
+        latencies.sort()
+        return {
+            'method': method,
+            'path': path,
+            'status_codes': sorted(status_codes),
+            'iterations': iterations,
+            'latency_ms': {
+                'p50': self.percentile(latencies, 50),
+                'p95': self.percentile(latencies, 95),
+                'p99': self.percentile(latencies, 99),
+                'mean': statistics.mean(latencies),
+                'max': latencies[-1],
+            },
+            'queries': {'mean': statistics.mean(queries), 'max': max(queries)},
+            'response_bytes': {'mean': statistics.mean(sizes), 'max': max(sizes)},
+        }
+
+    @staticmethod
+    def percentile(sorted_values, percent):
+        # nearest-rank method
+        rank = max(int(math.ceil(percent / 100 * len(sorted_values))), 1)
+        return sorted_values[rank - 1]
+
+    @staticmethod
+    def get_meta(options):
+        try:
+            commit = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': {
+                'advices': Advice.objects.count(),
+                'forum_questions': ForumQuestion.objects.count(),
+                'forum_answers': ForumAnswers.objects.count(),
+                'users': UserScore.objects.count(),
+            },
+        }
+
+    def print_report(self, results, compare):
+        baseline = {}
+        if compare:
+            with open(compare) as baseline_file:
+                baseline = json.load(baseline_file)['endpoints']
+        self.stdout.write('%-40s %9s %9s %9s %8s %10s' % (
+            'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'bytes'))
+        for name, result in sorted(results.items()):
+            latency = result['latency_ms']
+            line = '%-40s %9.2f %9.2f %9.2f %8.1f %10d' % (
+                name[:40], latency['p50'], latency['p95'], latency['p99'],
+                result['queries']['mean'], result['response_bytes']['mean'])
+            if name in baseline:
+                before = baseline[name]['latency_ms']['p50']
+                line += '  p50 %+.1f%%' % ((latency['p50'] - before) / before * 100 if before else 0)
+            self.stdout.write(line)
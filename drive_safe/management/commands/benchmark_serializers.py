@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from drive_safe.models import Advice, ForumAnswers, ForumQuestion
+from drive_safe.renderers import FastJSONRenderer, orjson
+from drive_safe.serializers import AdviceSerializer, ForumAnswersSerializer, ForumQuestionsSerializer
+from drive_safe.values import ValuesSerializer
+
+CASES = {
+    'advices': (Advice.objects.prefetch_related('tags'), AdviceSerializer),
+    'forum_questions': (ForumQuestion.objects.all(), ForumQuestionsSerializer),
+    'forum_answers': (ForumAnswers.objects.all(), ForumAnswersSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare throughput of ModelSerializer + JSONRenderer with ValuesSerializer + '
+            'FastJSONRenderer on pages of the list endpoints and check both give the same bytes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50, help='Rows in one page.')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write('orjson: %s' % ('installed' if orjson else 'not installed'))
+        self.stdout.write('%-16s %14s %14s %8s' % ('endpoint', 'model rows/s', 'values rows/s', 'speedup'))
+        for name, (queryset, serializer_class) in CASES.items():
+            queryset = queryset.order_by('date_added', 'id')[:options['rows']]
+            values_serializer = ValuesSerializer(serializer_class)
+
+            def model_path():
+                data = serializer_class(list(queryset), many=True).data
+                return JSONRenderer().render(data)
+
+            def values_path():
+                data = values_serializer.to_representation(list(values_serializer.values(queryset)))
+                return FastJSONRenderer().render(data)
+
+            if model_path() != values_path():
+                raise CommandError('%s: outputs differ' % name)
+            rows = len(queryset)
+            if not rows:
+                self.stderr.write('Skipping %s, no rows' % name)
+                continue
+            model_rate = rows * options['iterations'] / self.measure(model_path, options['iterations'])
+            values_rate = rows * options['iterations'] / self.measure(values_path, options['iterations'])
+            self.stdout.write('%-16s %14.0f %14.0f %7.1fx' % (
+                name, model_rate, values_rate, values_rate / model_rate))
+
+    @staticmethod
+    def measure(function, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        return time.perf_counter() - start
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drive_safe.schema import SCHEMA_FORMATS, generate_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = ('Generate the OpenAPI schema files served at swagger.json and swagger.yaml. '
+            'Run it at build time, with --check it fails when the stored files differ from the code.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Compare the stored schema with the code instead of writing it.')
+        parser.add_argument('--format', dest='formats', action='append',
+                            choices=sorted(SCHEMA_FORMATS), help='Format to generate, all by default.')
+
+    def handle(self, *args, **options):
+        outdated = []
+        for format in options['formats'] or sorted(SCHEMA_FORMATS):
+            path = schema_path(format)
+            content = generate_schema(format)
+            if options['check']:
+                try:
+                    with open(path, 'rb') as schema_file:
+                        stored = schema_file.read()
+                except FileNotFoundError:
+                    stored = None
+                if stored != content:
+                    outdated.append(path)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # replace the file at once, workers may be reading it
+            with open(path + '.tmp', 'wb') as schema_file:
+                schema_file.write(content)
+            os.replace(path + '.tmp', path)
+            self.stdout.write('Wrote %s' % path)
+        if outdated:
+            raise CommandError('Schema out of date, run manage.py generate_schema: %s'
+                               % ', '.join(outdated))
@@ -0,0 +1,350 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from drive_safe.cache import invalidate_advice_test, invalidate_advices, invalidate_tags
+from drive_safe.grading import invalidate_answer_key
+from drive_safe.models import Advice, Tags, TestQuestions
+from drive_safe.search import update_search_vectors
+from drive_safe.sync import record_changes
+
+ADVICE_FIELDS = ('title', 'text', 'test_points')
+QUESTION_FIELDS = ('question_text', 'answer_a', 'answer_b', 'answer_c', 'correct_answer')
+
+
+def bulk_update(model, objects, fields):
+    """
+    Save given fields of objects with a single UPDATE statement, like
+    QuerySet.bulk_update of newer Django versions.
+    """
+    if not objects:
+        return
+    updates = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        updates[name] = Case(*[
+            When(pk=obj.pk, then=Value(getattr(obj, name), output_field=field))
+            for obj in objects
+        ], output_field=field)
+    model.objects.filter(pk__in=[obj.pk for obj in objects]).update(**updates)
+
+
+def read_jsonl(lines):
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as error:
+                raise CommandError('Line %d: %s' % (line_number, error))
+
+
+def number_rows(reader):
+    """
+    Yield rows of a csv.DictReader with the number of their first line,
+    groupby reads one row ahead of the group it returns.
+    """
+    # read the header
+    reader.fieldnames
+    while True:
+        line_number = reader.line_num + 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        yield line_number, row
+
+
+def read_csv(lines):
+    """
+    Yield records from CSV rows with one test question per row. Consecutive
+    rows with the same key belong to one advice, whose fields are read from
+    the first of them, a key can't come back after other keys. Tags are
+    separated with "|".
+    """
+    reader = csv.DictReader(lines)
+    first_lines = {}
+    for key, rows in itertools.groupby(number_rows(reader), key=lambda item: item[1].get('key')):
+        line_number, first = next(rows)
+        if key in first_lines:
+            raise CommandError('Line %d: key %s continues the advice of line %d, its rows must be '
+                               'consecutive' % (line_number, key, first_lines[key]))
+        first_lines[key] = line_number
+        rows = [first] + [row for _, row in rows]
+        yield line_number, {
+            'key': key,
+            'title': first.get('title'),
+            'text': first.get('text'),
+            'test_points': first.get('test_points'),
+            'tags': [name for name in (first.get('tags') or '').split('|') if name.strip()],
+            'questions': [
+                dict({'key': row.get('question_key') or None},
+                     **{name: row.get(name) for name in QUESTION_FIELDS})
+                for row in rows if row.get('question_text')
+            ],
+        }
+
+
+def is_key(value):
+    # bool is an int, but not a key
+    return value is None or isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def clean_record(record):
+    """
+    Validate a record and return it normalized, raise ValueError otherwise.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('record is not an object')
+    if not is_key(record.get('key')):
+        raise ValueError('key is not a string or a number')
+    key = str(record.get('key') or '').strip()
+    if not key or len(key) > Advice._meta.get_field('import_key').max_length:
+        raise ValueError('key is missing or too long')
+    for name in ('title', 'text'):
+        if not record.get(name):
+            raise ValueError('%s is missing' % name)
+        if not isinstance(record[name], str):
+            raise ValueError('%s is not a string' % name)
+    if len(record['title']) > Advice._meta.get_field('title').max_length:
+        raise ValueError('title is too long')
+    if isinstance(record.get('test_points'), (bool, float)):
+        raise ValueError('test_points is not a whole number')
+    try:
+        test_points = int(record.get('test_points'))
+    except (TypeError, ValueError):
+        raise ValueError('test_points is not a number')
+
+    if not isinstance(record.get('tags') or [], list):
+        raise ValueError('tags is not a list')
+    tags = []
+    for name in record.get('tags') or ():
+        if not isinstance(name, str):
+            raise ValueError('tag %r is not a string' % (name,))
+        name = name.strip()
+        if len(name) > Tags._meta.get_field('name').max_length:
+            raise ValueError('tag %r is too long' % name)
+        if name not in tags:
+            tags.append(name)
+
+    if not isinstance(record.get('questions') or [], list):
+        raise ValueError('questions is not a list')
+    questions = []
+    for index, question in enumerate(record.get('questions') or (), 1):
+        if not isinstance(question, dict):
+            raise ValueError('question %d is not an object' % index)
+        if any(not question.get(name) for name in QUESTION_FIELDS):
+            raise ValueError('question %d is incomplete' % index)
+        if any(not isinstance(question[name], str) for name in QUESTION_FIELDS):
+            raise ValueError('question %d has a field that is not a string' % index)
+        if not is_key(question.get('key')):
+            raise ValueError('question %d key is not a string or a number' % index)
+        correct_answer = question['correct_answer'].strip().lower()
+        if correct_answer not in ('a', 'b', 'c'):
+            raise ValueError('question %d has no correct answer a, b or c' % index)
+        question_key = '%s:%s' % (key, question.get('key') or index)
+        if len(question_key) > TestQuestions._meta.get_field('import_key').max_length:
+            raise ValueError('question %d key is too long' % index)
+        questions.append(dict(
+            {name: question[name] for name in QUESTION_FIELDS},
+            import_key=question_key, correct_answer=correct_answer))
+
+    return {
+        'key': key,
+        'title': record['title'],
+        'text': record['text'],
+        'test_points': test_points,
+        'tags': tags,
+        'questions': questions,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Import advices with their tags and test questions from a JSONL or CSV file. '
+            'Advices and questions are matched by their keys, so the import can be repeated '
+            'to apply changes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads standard input.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='File format, guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of advices saved in one transaction.')
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if options['path'].lower().endswith('.csv') else 'jsonl'
+        reader = read_csv if file_format == 'csv' else read_jsonl
+
+        self.tag_ids = {}
+        self.stats = dict.fromkeys((
+            'advices created', 'advices updated', 'advices unchanged',
+            'questions created', 'questions updated', 'questions deleted'), 0)
+        start = time.perf_counter()
+        processed = 0
+
+        if options['path'] == '-':
+            lines = sys.stdin
+        else:
+            if not os.path.exists(options['path']):
+                raise CommandError('File %s does not exist' % options['path'])
+            lines = open(options['path'], encoding='utf-8', newline='')
+        with lines:
+            batch = []
+            for line_number, record in reader(lines):
+                try:
+                    batch.append(clean_record(record))
+                except ValueError as error:
+                    raise CommandError('Line %d: %s' % (line_number, error))
+                if len(batch) == options['batch_size']:
+                    processed += self.import_batch(batch)
+                    self.report_progress(processed, start)
+                    batch = []
+            if batch:
+                processed += self.import_batch(batch)
+                self.report_progress(processed, start)
+
+        self.stdout.write(', '.join('%s: %d' % item for item in self.stats.items()))
+
+    def report_progress(self, processed, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write('Imported %d advices (%.0f advices/s)' % (
+            processed, processed / elapsed if elapsed else 0))
+
+    def import_batch(self, records):
+        # a key repeated within the batch is imported once, with its last record
+        records = {record['key']: record for record in records}
+        with transaction.atomic():
+            advice_ids, changed_ids, text_changed_ids = self.save_advices(records)
+            changed_ids |= self.save_tags(records, advice_ids)
+            test_changed_ids = self.save_questions(records, advice_ids)
+            if changed_ids:
+                Advice.objects.filter(pk__in=changed_ids).update(updated_at=timezone.now())
+            # bulk queries bypass the model signals
+            if text_changed_ids:
+                update_search_vectors(Advice.objects.filter(pk__in=text_changed_ids))
+            record_changes(Advice, changed_ids)
+
+        if changed_ids:
+            invalidate_advices(changed_ids)
+            invalidate_tags()
+        for advice_id in test_changed_ids:
+            invalidate_advice_test(advice_id)
+            invalidate_answer_key(advice_id)
+        return len(records)
+
+    def save_advices(self, records):
+        """
+        Create and update advices, return a dict mapping keys to ids, ids of
+        changed advices and ids of advices with a new title or text.
+        """
+        existing = Advice.objects.only('import_key', *ADVICE_FIELDS).in_bulk(
+            list(records), field_name='import_key')
+        created = Advice.objects.bulk_create([
+            Advice(import_key=key, **{name: record[name] for name in ADVICE_FIELDS})
+            for key, record in records.items() if key not in existing
+        ])
+        updated = []
+        text_changed_ids = {advice.pk for advice in created}
+        for key, advice in existing.items():
+            record = records[key]
+            if any(getattr(advice, name) != record[name] for name in ADVICE_FIELDS):
+                if advice.title != record['title'] or advice.text != record['text']:
+                    text_changed_ids.add(advice.pk)
+                for name in ADVICE_FIELDS:
+                    setattr(advice, name, record[name])
+                updated.append(advice)
+        bulk_update(Advice, updated, ADVICE_FIELDS)
+
+        self.stats['advices created'] += len(created)
+        self.stats['advices updated'] += len(updated)
+        self.stats['advices unchanged'] += len(existing) - len(updated)
+        advice_ids = {advice.import_key: advice.pk for advice in created}
+        advice_ids.update((key, advice.pk) for key, advice in existing.items())
+        return advice_ids, {advice.pk for advice in created + updated}, text_changed_ids
+
+    def get_tag_ids(self, names):
+        """
+        Return a dict mapping tag names to ids, creating missing tags.
+        """
+        missing = {name for name in names if name not in self.tag_ids}
+        if missing:
+            # names are not unique, prefer the oldest tag
+            for tag_id, name in Tags.objects.filter(name__in=missing).order_by('-id').values_list(
+                    'id', 'name'):
+                self.tag_ids[name] = tag_id
+            created = Tags.objects.bulk_create([
+                Tags(name=name) for name in sorted(missing) if name not in self.tag_ids
+            ])
+            record_changes(Tags, [tag.pk for tag in created])
+            self.tag_ids.update((tag.name, tag.pk) for tag in created)
+        return {name: self.tag_ids[name] for name in names}
+
+    def save_tags(self, records, advice_ids):
+        """
+        Make tags of advices match the records, return ids of changed advices.
+        """
+        tag_ids = self.get_tag_ids({name for record in records.values() for name in record['tags']})
+        wanted = {
+            (advice_ids[key], tag_ids[name])
+            for key, record in records.items()
+            for name in record['tags']
+        }
+        links = Advice.tags.through.objects.filter(advice_id__in=advice_ids.values())
+        existing = {(advice_id, tag_id): link_id for link_id, advice_id, tag_id in links.values_list(
+            'id', 'advice_id', 'tags_id')}
+        removed = {pair: link_id for pair, link_id in existing.items() if pair not in wanted}
+        added = wanted.difference(existing)
+        if removed:
+            Advice.tags.through.objects.filter(pk__in=removed.values()).delete()
+        Advice.tags.through.objects.bulk_create([
+            Advice.tags.through(advice_id=advice_id, tags_id=tag_id)
+            for advice_id, tag_id in sorted(added)
+        ])
+        return {advice_id for advice_id, _ in itertools.chain(added, removed)}
+
+    def save_questions(self, records, advice_ids):
+        """
+        Make test questions of advices match the records, return ids of
+        advices with a changed test.
+        """
+        # questions added by hand have no import key and are kept
+        existing = {
+            question.import_key: question
+            for question in TestQuestions.objects.filter(
+                advice_id__in=advice_ids.values(), import_key__isnull=False)
+        }
+        created = []
+        updated = []
+        for key, record in records.items():
+            for fields in record['questions']:
+                question = existing.pop(fields['import_key'], None)
+                if question is None:
+                    created.append(TestQuestions(advice_id=advice_ids[key], **fields))
+                elif any(getattr(question, name) != fields[name] for name in QUESTION_FIELDS):
+                    for name in QUESTION_FIELDS:
+                        setattr(question, name, fields[name])
+                    question.updated_at = timezone.now()
+                    updated.append(question)
+        # questions left over were removed from the records
+        deleted = list(existing.values())
+
+        TestQuestions.objects.bulk_create(created)
+        bulk_update(TestQuestions, updated, QUESTION_FIELDS + ('updated_at',))
+        record_changes(TestQuestions, [question.pk for question in created + updated])
+        if deleted:
+            # sends post_delete, which records the tombstones
+            TestQuestions.objects.filter(pk__in=[question.pk for question in deleted]).delete()
+
+        self.stats['questions created'] += len(created)
+        self.stats['questions updated'] += len(updated)
+        self.stats['questions deleted'] += len(deleted)
+        return {question.advice_id for question in created + updated + deleted}
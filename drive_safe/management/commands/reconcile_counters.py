@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from drive_safe.counters import reconcile_answer_counts, reconcile_pass_counts
+from drive_safe.models import Advice, ForumQuestion
+from drive_safe.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = ('Recompute denormalized test pass counts of advices and answer counts and last '
+            'activity of forum questions, fixing rows that drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of ids checked by one UPDATE statement.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for name, model, reconcile in (('advices', Advice, reconcile_pass_counts),
+                                       ('forum questions', ForumQuestion, reconcile_answer_counts)):
+            last_id = model.objects.aggregate(Max('id'))['id__max'] or 0
+            fixed = 0
+            for start in range(0, last_id, batch_size):
+                # drift is found on the primary, replicas may lag behind
+                with use_primary():
+                    fixed += len(reconcile(model.objects.filter(
+                        id__gt=start, id__lte=start + batch_size)))
+            self.stdout.write('Fixed %d %s' % (fixed, name))
@@ -0,0 +1,153 @@
+import random
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from drive_safe.cache import (FORUM_ANSWERS_VERSION_KEY, FORUM_QUESTIONS_VERSION_KEY, invalidate_advices,
+                              invalidate_collection, invalidate_tags)
+from drive_safe.leaderboard import score_ranking
+from drive_safe.models import (Advice, ForumAnswers, ForumQuestion, Tags, TestPassed,
+                               TestQuestions, UserScore)
+from drive_safe.search import update_search_vectors
+from drive_safe.sync import record_missing_changes
+
+WORDS = (
+    'droga pas ruchu skrzyżowanie pieszy rower hamowanie prędkość opony '
+    'światła znak rondo autostrada parkowanie wyprzedzanie deszcz mgła '
+    'zima noc dziecko pierwszeństwo sygnalizacja kierowca samochód'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a configurable volume of synthetic data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--advices', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-advice', type=int, default=3)
+        parser.add_argument('--questions-per-advice', type=int, default=10)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--passes-per-user', type=int, default=5)
+        parser.add_argument('--forum-questions', type=int, default=5000)
+        parser.add_argument('--answers-per-question', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed of the random generator, for repeatable data.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            tag_ids = self.create_tags(options['tags'])
+            advice_points = self.create_advices(options['advices'], tag_ids,
+                                                options['tags_per_advice'],
+                                                options['questions_per_advice'])
+            user_ids = self.create_users(options['users'], advice_points,
+                                         options['passes_per_user'])
+            self.create_forum(options['forum_questions'],
+                              options['answers_per_question'],
+                              list(advice_points), user_ids)
+
+        # bulk inserts bypass the model signals
+        update_search_vectors(Advice.objects.filter(search_vector__isnull=True))
+        update_search_vectors(ForumQuestion.objects.filter(search_vector__isnull=True))
+        record_missing_changes()
+        call_command('reconcile_counters', stdout=self.stdout)
+        invalidate_advices([])
+        invalidate_tags()
+        invalidate_collection(FORUM_QUESTIONS_VERSION_KEY)
+        invalidate_collection(FORUM_ANSWERS_VERSION_KEY)
+        score_ranking.reset()
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def bulk_create(self, model, objects, value=lambda obj: obj.pk):
+        """
+        Insert objects in batches, return value(obj) of every inserted object,
+        its id by default.
+        """
+        values = []
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                values.extend(value(obj) for obj in model.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            values.extend(value(obj) for obj in model.objects.bulk_create(batch))
+        self.stdout.write('Created %d %s rows' % (len(values), model._meta.model_name))
+        return values
+
+    def create_tags(self, number):
+        return self.bulk_create(Tags, (
+            Tags(name='%s-%d' % (self.random.choice(WORDS), n))
+            for n in range(number)
+        ))
+
+    def create_advices(self, number, tag_ids, tags_per_advice, questions_per_advice):
+        advice_points = dict(self.bulk_create(Advice, (
+            Advice(title=self.sentence(4)[:128], text=self.sentence(300),
+                   test_points=self.random.randint(1, 10))
+            for _ in range(number)
+        ), value=lambda advice: (advice.pk, advice.test_points)))
+        advice_ids = list(advice_points)
+        if tag_ids:
+            self.bulk_create(Advice.tags.through, (
+                Advice.tags.through(advice_id=advice_id, tags_id=tag_id)
+                for advice_id in advice_ids
+                for tag_id in self.random.sample(tag_ids, min(tags_per_advice, len(tag_ids)))
+            ))
+        self.bulk_create(TestQuestions, (
+            TestQuestions(advice_id=advice_id, question_text=self.sentence(12),
+                          answer_a=self.sentence(5), answer_b=self.sentence(5),
+                          answer_c=self.sentence(5),
+                          correct_answer=self.random.choice('abc'))
+            for advice_id in advice_ids
+            for _ in range(questions_per_advice)
+        ))
+        return advice_points
+
+    def create_users(self, number, advice_points, passes_per_user):
+        password = make_password(None)
+        prefix = uuid.uuid4().hex[:8]
+        user_ids = self.bulk_create(User, (
+            User(username='seed-%s-%d' % (prefix, n), password=password)
+            for n in range(number)
+        ))
+        advice_ids = list(advice_points)
+        passes = {
+            user_id: self.random.sample(advice_ids, min(passes_per_user, len(advice_ids)))
+            for user_id in user_ids
+        }
+        self.bulk_create(TestPassed, (
+            TestPassed(user_id=user_id, advice_id=advice_id)
+            for user_id, passed_advice_ids in passes.items()
+            for advice_id in passed_advice_ids
+        ))
+        self.bulk_create(UserScore, (
+            UserScore(user_id=user_id,
+                      score=sum(advice_points[advice_id] for advice_id in passed_advice_ids))
+            for user_id, passed_advice_ids in passes.items()
+        ))
+        return user_ids
+
+    def create_forum(self, number, answers_per_question, advice_ids, user_ids):
+        if not advice_ids or not user_ids:
+            return
+        question_ids = self.bulk_create(ForumQuestion, (
+            ForumQuestion(text=self.sentence(30), advice_id=self.random.choice(advice_ids),
+                          user_id=self.random.choice(user_ids))
+            for _ in range(number)
+        ))
+        self.bulk_create(ForumAnswers, (
+            ForumAnswers(text=self.sentence(40), question_id=question_id,
+                         user_id=self.random.choice(user_ids))
+            for question_id in question_ids
+            for _ in range(answers_per_question)
+        ))
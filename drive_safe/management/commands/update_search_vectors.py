@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from drive_safe.search import SEARCH_MODELS, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recompute full-text search vectors of advices and forum questions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of ids updated by one UPDATE statement.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for name, model in SEARCH_MODELS.items():
+            last_id = model.objects.aggregate(Max('id'))['id__max'] or 0
+            updated = 0
+            for start in range(0, last_id, batch_size):
+                updated += update_search_vectors(model.objects.filter(
+                    id__gt=start, id__lte=start + batch_size))
+            self.stdout.write('Updated %d %s' % (updated, name))
@@ -0,0 +1,112 @@
+"""
+In-process registry of per-endpoint request metrics, rendered in the
+Prometheus text exposition format.
+
+Metrics are kept by every worker process separately, so Prometheus should
+scrape the workers directly (each with its own instance label) rather than
+through a load balancer.
+"""
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointMetrics:
+    __slots__ = ('buckets', 'duration_sum', 'count', 'queries', 'query_duration',
+                 'response_bytes')
+
+    def __init__(self, number_of_buckets):
+        # the last bucket is +Inf
+        self.buckets = [0] * (number_of_buckets + 1)
+        self.duration_sum = 0.0
+        self.count = 0
+        self.queries = 0
+        self.query_duration = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+
+    def __init__(self, buckets):
+        self.bucket_bounds = tuple(sorted(buckets))
+        self._endpoints = {}
+        self._status_codes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status_code, duration, queries,
+                query_duration, response_bytes):
+        key = (endpoint, method)
+        bucket = bisect_left(self.bucket_bounds, duration)
+        with self._lock:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = EndpointMetrics(len(self.bucket_bounds))
+            metrics.buckets[bucket] += 1
+            metrics.duration_sum += duration
+            metrics.count += 1
+            metrics.queries += queries
+            metrics.query_duration += query_duration
+            metrics.response_bytes += response_bytes
+            status_key = key + (status_code,)
+            self._status_codes[status_key] = self._status_codes.get(status_key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._status_codes.clear()
+
+    def render(self):
+        with self._lock:
+            endpoints = sorted(
+                (key, metrics.buckets[:], metrics.duration_sum, metrics.count,
+                 metrics.queries, metrics.query_duration, metrics.response_bytes)
+                for key, metrics in self._endpoints.items()
+            )
+            status_codes = sorted(self._status_codes.items())
+
+        lines = [
+            '# HELP drive_safe_requests_total Number of handled requests.',
+            '# TYPE drive_safe_requests_total counter',
+        ]
+        for (endpoint, method, status_code), count in status_codes:
+            lines.append('drive_safe_requests_total{%s,status="%d"} %d' % (
+                labels(endpoint, method), status_code, count))
+
+        lines += [
+            '# HELP drive_safe_request_duration_seconds Request handling time.',
+            '# TYPE drive_safe_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), buckets, duration_sum, count, _, _, _ in endpoints:
+            endpoint_labels = labels(endpoint, method)
+            cumulative = 0
+            for bound, bucket in zip(self.bucket_bounds + ('+Inf',), buckets):
+                cumulative += bucket
+                lines.append('drive_safe_request_duration_seconds_bucket{%s,le="%s"} %d' % (
+                    endpoint_labels, bound, cumulative))
+            lines.append('drive_safe_request_duration_seconds_sum{%s} %r' % (
+                endpoint_labels, duration_sum))
+            lines.append('drive_safe_request_duration_seconds_count{%s} %d' % (
+                endpoint_labels, count))
+
+        counters = (
+            ('drive_safe_db_queries_total', 'Number of SQL queries.', 4),
+            ('drive_safe_db_query_duration_seconds_total', 'Time spent in SQL queries.', 5),
+            ('drive_safe_response_bytes_total', 'Size of response bodies.', 6),
+        )
+        for name, help_text, index in counters:
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+            for endpoint in endpoints:
+                (endpoint_name, method) = endpoint[0]
+                lines.append('%s{%s} %r' % (name, labels(endpoint_name, method), endpoint[index]))
+        return '\n'.join(lines) + '\n'
+
+
+def labels(endpoint, method):
+    endpoint = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+    return 'endpoint="%s",method="%s"' % (endpoint, method)
+
+
+registry = MetricsRegistry(getattr(settings, 'DRIVE_SAFE_METRICS_BUCKETS', DEFAULT_BUCKETS))
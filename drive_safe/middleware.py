@@ -0,0 +1,174 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from drive_safe.instrumentation import QueryRecorder
+from drive_safe.metrics import registry
+from drive_safe.routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+def get_endpoint_name(request):
+    """
+    Return name of the resolved URL pattern, or the view path for unnamed
+    patterns. Unresolved paths share one name to bound the label count.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Record count, latency, SQL queries, SQL time and response size of every
+    request per endpoint in drive_safe.metrics.registry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.observe_stream(
+                request, response, response.streaming_content, recorder, start)
+        else:
+            self.observe(request, response, recorder, start, len(response.content))
+        return response
+
+    def observe_stream(self, request, response, content, recorder, start):
+        """
+        Pass through the streamed body, recording the request when it ends.
+        """
+        response_bytes = 0
+        try:
+            with recorder:
+                for chunk in content:
+                    response_bytes += len(chunk)
+                    yield chunk
+        finally:
+            self.observe(request, response, recorder, start, response_bytes)
+
+    @staticmethod
+    def observe(request, response, recorder, start, response_bytes):
+        registry.observe(get_endpoint_name(request), request.method,
+                         response.status_code, time.perf_counter() - start,
+                         recorder.count, recorder.duration, response_bytes)
+
+
+class ProfilingMiddleware:
+    """
+    Run chosen requests under cProfile and write the profile (.prof, readable
+    with pstats or snakeviz) and a trace of their SQL statements (.json) to
+    DRIVE_SAFE_PROFILING_DIR.
+
+    Requests are profiled when DRIVE_SAFE_PROFILING is on and either carry
+    the DRIVE_SAFE_PROFILING_TOKEN in the X-Drive-Safe-Profile header or are
+    drawn with DRIVE_SAFE_PROFILING_SAMPLE_RATE probability. Other requests
+    only pay for reading the settings.
+    """
+
+    header = 'HTTP_X_DRIVE_SAFE_PROFILE'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with QueryRecorder(record_sql=True) as recorder:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        profile_id = '%s-%s' % (timezone.now().strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+        try:
+            self.write(profile_id, request, response, profiler, recorder, duration)
+        except OSError:
+            logger.exception('Could not write profile %s', profile_id)
+        else:
+            response['X-Drive-Safe-Profile-Id'] = profile_id
+        return response
+
+    def should_profile(self, request):
+        if not getattr(settings, 'DRIVE_SAFE_PROFILING', False):
+            return False
+        token = getattr(settings, 'DRIVE_SAFE_PROFILING_TOKEN', None)
+        if token and constant_time_compare(request.META.get(self.header, ''), token):
+            return True
+        return random.random() < getattr(settings, 'DRIVE_SAFE_PROFILING_SAMPLE_RATE', 0)
+
+    @staticmethod
+    def write(profile_id, request, response, profiler, recorder, duration):
+        directory = settings.DRIVE_SAFE_PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, profile_id)
+        profiler.dump_stats(path + '.prof')
+        trace = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'endpoint': get_endpoint_name(request),
+            'status': response.status_code,
+            'duration': duration,
+            'query_count': recorder.count,
+            'query_duration': recorder.duration,
+            'queries': recorder.statements,
+        }
+        with open(path + '.json', 'w') as trace_file:
+            json.dump(trace, trace_file, indent=2)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pin write requests to the primary database and give their clients a
+    cookie that pins their reads to the primary for
+    DRIVE_SAFE_READ_YOUR_WRITES_SECONDS, longer than the replication lag,
+    so users see their own changes. Streamed response bodies stay pinned
+    while the server iterates them.
+    """
+
+    cookie_name = 'drive_safe_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        write = request.method not in self.safe_methods
+        if not write and self.cookie_name not in request.COOKIES:
+            return self.get_response(request)
+
+        with use_primary():
+            response = self.get_response(request)
+        if response.streaming:
+            # streamed bodies are read after the view returns
+            response.streaming_content = self.read_primary(response.streaming_content)
+        if write and response.status_code < 400:
+            response.set_cookie(self.cookie_name, '1', httponly=True,
+                                max_age=getattr(settings, 'DRIVE_SAFE_READ_YOUR_WRITES_SECONDS', 10))
+        return response
+
+    @staticmethod
+    def read_primary(content):
+        with use_primary():
+            yield from content
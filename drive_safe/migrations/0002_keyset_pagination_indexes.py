@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advice',
+            index=models.Index(fields=['date_added', 'id'], name='advice_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumanswers',
+            index=models.Index(fields=['date_added', 'id'], name='answer_date_added_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumquestion',
+            index=models.Index(fields=['date_added', 'id'], name='question_date_added_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_passes(apps, schema_editor):
+    """
+    Keep only the first TestPassed row of every (user, advice) pair,
+    so the unique constraint can be created.
+    """
+    TestPassed = apps.get_model('drive_safe', 'TestPassed')
+    duplicates = TestPassed.objects.values('user_id', 'advice_id').annotate(
+        first_id=Min('id'), passes=Count('id')).filter(passes__gt=1)
+    for duplicate in duplicates:
+        TestPassed.objects.filter(
+            user_id=duplicate['user_id'], advice_id=duplicate['advice_id']
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('drive_safe', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_passes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='testpassed',
+            unique_together={('user', 'advice')},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0003_unique_test_passed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='forumanswers',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='forumquestion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='testquestions',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vectors(apps, schema_editor):
+    config = getattr(settings, 'DRIVE_SAFE_SEARCH_CONFIG', 'simple')
+    Advice = apps.get_model('drive_safe', 'Advice')
+    ForumQuestion = apps.get_model('drive_safe', 'ForumQuestion')
+    Advice.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)))
+    ForumQuestion.objects.update(
+        search_vector=SearchVector('text', weight='B', config=config))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advice',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='forumquestion',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='advice',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='advice_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumquestion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='question_search_vector_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
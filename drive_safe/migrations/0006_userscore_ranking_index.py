@@ -0,0 +1,17 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0005_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userscore',
+            index=models.Index(fields=['-score', 'user'], name='userscore_score_user_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0006_userscore_ranking_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advice',
+            name='import_key',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='testquestions',
+            name='import_key',
+            field=models.CharField(editable=False, max_length=129, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0007_import_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumanswers',
+            index=models.Index(fields=['question', 'date_added', 'id'], name='answer_question_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumanswers',
+            index=models.Index(fields=['user', 'date_added', 'id'], name='answer_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumquestion',
+            index=models.Index(fields=['advice', 'date_added', 'id'], name='question_advice_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumquestion',
+            index=models.Index(fields=['user', 'date_added', 'id'], name='question_user_date_id_idx'),
+        ),
+    ]
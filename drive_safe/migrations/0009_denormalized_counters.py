@@ -0,0 +1,52 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def fill_counters(apps, schema_editor):
+    Advice = apps.get_model('drive_safe', 'Advice')
+    TestPassed = apps.get_model('drive_safe', 'TestPassed')
+    ForumQuestion = apps.get_model('drive_safe', 'ForumQuestion')
+    ForumAnswers = apps.get_model('drive_safe', 'ForumAnswers')
+
+    passes = TestPassed.objects.filter(advice=OuterRef('pk')).order_by().values(
+        'advice').annotate(count=Count('pk')).values('count')
+    Advice.objects.update(pass_count=Coalesce(
+        Subquery(passes, output_field=models.IntegerField()), 0))
+
+    answers = ForumAnswers.objects.filter(question=OuterRef('pk')).order_by().values('question')
+    ForumQuestion.objects.update(
+        answer_count=Coalesce(Subquery(answers.annotate(count=Count('pk')).values('count'),
+                                       output_field=models.IntegerField()), 0),
+        last_activity=Coalesce(Subquery(answers.annotate(latest=Max('updated_at')).values('latest')),
+                               F('updated_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0008_forum_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advice',
+            name='pass_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Liczba zaliczeń testu'),
+        ),
+        migrations.AddField(
+            model_name='forumquestion',
+            name='answer_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='forumquestion',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
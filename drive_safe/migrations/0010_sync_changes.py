@@ -0,0 +1,37 @@
+# Generated by Django 2.1.7 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+def fill_sync_changes(apps, schema_editor):
+    SyncChange = apps.get_model('drive_safe', 'SyncChange')
+    for name, model_name in (('tags', 'Tags'), ('advices', 'Advice'),
+                             ('test_questions', 'TestQuestions')):
+        model = apps.get_model('drive_safe', model_name)
+        SyncChange.objects.bulk_create([
+            SyncChange(model=name, object_id=object_id)
+            for object_id in model.objects.order_by('pk').values_list('pk', flat=True)
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0009_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'unique_together': {('model', 'object_id')},
+            },
+        ),
+        migrations.RunPython(fill_sync_changes, migrations.RunPython.noop),
+    ]
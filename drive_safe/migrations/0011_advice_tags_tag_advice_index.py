@@ -0,0 +1,19 @@
+# Generated by Django 2.1.7 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive_safe', '0010_sync_changes'),
+    ]
+
+    # covers the tags_id lookups of the advices/?tags= filter, the
+    # auto-created join table can't declare Meta.indexes
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX advice_tags_tag_advice_idx ON drive_safe_advice_tags (tags_id, advice_id)',
+            'DROP INDEX advice_tags_tag_advice_idx',
+        ),
+    ]
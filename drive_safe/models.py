@@ -1,5 +1,8 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 
 
 # Create your models here.
@@ -7,9 +10,13 @@ class Advice(models.Model):
     title = models.CharField(max_length=128, verbose_name="Tytuł porady")
     text = models.TextField(verbose_name="Tekst porady")
     date_added = models.DateField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     tags = models.ManyToManyField("Tags", verbose_name="Tagi")
     test_points = models.SmallIntegerField(verbose_name="Ilość pkt za test")
     passed_by = models.ManyToManyField(User, related_name="users_tests_passed", through='TestPassed')
+    search_vector = SearchVectorField(null=True, editable=False)
+    import_key = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    pass_count = models.IntegerField(default=0, editable=False, verbose_name="Liczba zaliczeń testu")
 
     def __str__(self):
         return self.title
@@ -17,6 +24,10 @@ class Advice(models.Model):
     class Meta:
         verbose_name = "Poradę"
         verbose_name_plural = "Porady"
+        indexes = [
+            models.Index(fields=['date_added', 'id'], name='advice_date_added_id_idx'),
+            GinIndex(fields=['search_vector'], name='advice_search_vector_idx'),
+        ]
 
 
 class TestPassed(models.Model):
@@ -24,6 +35,9 @@ class TestPassed(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     advice_test_passed = models.BooleanField(default=True)
 
+    class Meta:
+        unique_together = ('user', 'advice')
+
 
 class Tags(models.Model):
     name = models.CharField(max_length=32, verbose_name="Nazwa tagu")
@@ -43,6 +57,8 @@ class TestQuestions(models.Model):
     answer_b = models.TextField(verbose_name="Odpowiedź B")
     answer_c = models.TextField(verbose_name="Odpowiedź C")
     correct_answer = models.CharField(max_length=1, verbose_name="Poprawna odpowiedź")
+    updated_at = models.DateTimeField(auto_now=True)
+    import_key = models.CharField(max_length=129, unique=True, null=True, editable=False)
 
     def __str__(self):
         return str(self.advice)
@@ -59,12 +75,29 @@ class UserScore(models.Model):
     def __str__(self):
         return str(self.score)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'user'], name='userscore_score_user_idx'),
+        ]
+
 
 class ForumQuestion(models.Model):
     text = models.TextField()
     advice = models.ForeignKey(Advice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_added = models.DateField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    answer_count = models.IntegerField(default=0, editable=False)
+    last_activity = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_added', 'id'], name='question_date_added_id_idx'),
+            models.Index(fields=['advice', 'date_added', 'id'], name='question_advice_date_id_idx'),
+            models.Index(fields=['user', 'date_added', 'id'], name='question_user_date_id_idx'),
+            GinIndex(fields=['search_vector'], name='question_search_vector_idx'),
+        ]
 
 
 class ForumAnswers(models.Model):
@@ -72,3 +105,24 @@ class ForumAnswers(models.Model):
     question = models.ForeignKey(ForumQuestion, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_added = models.DateField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_added', 'id'], name='answer_date_added_id_idx'),
+            models.Index(fields=['question', 'date_added', 'id'], name='answer_question_date_id_idx'),
+            models.Index(fields=['user', 'date_added', 'id'], name='answer_user_date_id_idx'),
+        ]
+
+
+class SyncChange(models.Model):
+    """
+    Latest change of an advice, tag or test question, see drive_safe.sync.
+    The id is the change sequence.
+    """
+    model = models.CharField(max_length=16)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('model', 'object_id')
@@ -0,0 +1,150 @@
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on the view ordering, (date_added, id)
+    by default.
+
+    The cursor stores the ordering values of the last row of a page and the
+    next page is fetched with a range condition on them, so with a matching
+    composite index page N costs the same as page 1 (no OFFSET scans).
+    The last ordering field has to be unique.
+    """
+
+    ordering = ('date_added', 'id')
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = getattr(settings, 'DRIVE_SAFE_MAX_PAGE_SIZE', 500)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'ordering', None) or self.ordering
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_position_filter(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # one extra row tells whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = [self.get_value(self.page[-1], field)
+                    for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(position))
+
+    def get_position_filter(self, position):
+        """
+        Build the "row comes after position" condition, e.g. for
+        (date_added, id): date_added > d OR (date_added = d AND id > i).
+        The leading bound on the first field lets the index range scan
+        start at the cursor.
+        """
+        if len(position) != len(self.ordering):
+            raise ValueError('Cursor does not match ordering')
+        fields = [(field.lstrip('-'), field.startswith('-'))
+                  for field in self.ordering]
+
+        first_name, first_descending = fields[0]
+        lookup = 'lte' if first_descending else 'gte'
+        bound = Q(**{'%s__%s' % (first_name, lookup): position[0]})
+
+        after = Q()
+        equal = Q()
+        for (name, descending), value in zip(fields, position):
+            lookup = 'lt' if descending else 'gt'
+            after |= equal & Q(**{'%s__%s' % (name, lookup): value})
+            equal &= Q(**{name: value})
+        return bound & after
+
+    @staticmethod
+    def get_value(obj, field):
+        name = field.lstrip('-')
+        # pages of values() querysets hold dicts
+        value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, separators=(',', ':')).encode('ascii')
+        return urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Cursor',
+                    description='The pagination cursor value.'
+                )
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(
+                    title='Page size',
+                    description='Number of results to return per page '
+                                '(at most %d).' % self.max_page_size
+                )
+            ),
+        ]
@@ -0,0 +1,27 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed. The output is the
+    same as JSONRenderer's: dates and other non-JSON types go through the DRF
+    encoder and pretty printed or ASCII-only output is left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except TypeError:
+            # e.g. integers over 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes them, to output a strict javascript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,51 @@
+"""
+Routing of reads to the read replicas listed in DRIVE_SAFE_REPLICAS.
+
+Writes always go to the primary (default) database. Reads go to a random
+replica unless the current thread is pinned to the primary: during write
+requests and requests inside the read-your-writes window set by
+drive_safe.middleware.ReplicaRoutingMiddleware, or inside a transaction on
+the primary, which has to see its own uncommitted rows.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+@contextmanager
+def use_primary():
+    """
+    Send all reads of the current thread to the primary database.
+    """
+    previous = getattr(_state, 'pinned', False)
+    _state.pinned = True
+    try:
+        yield
+    finally:
+        _state.pinned = previous
+
+
+def get_replicas():
+    return getattr(settings, 'DRIVE_SAFE_REPLICAS', ())
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if (not replicas or getattr(_state, 'pinned', False)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold copies of the same data
+        return True
@@ -0,0 +1,77 @@
+"""
+Precomputed OpenAPI schema.
+
+Generating the schema introspects every view and serializer, so it is
+written once by manage.py generate_schema into DRIVE_SAFE_SCHEMA_DIR, one
+file per format named after the API version (openapi-v1.json), and served
+by drive_safe.views.api_schema as the stored bytes with an ETag.
+"""
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.utils.http import quote_etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = 'v1'
+
+api_info = openapi.Info(
+    title="Snippets API",
+    default_version=API_VERSION,
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+# format: (codec class, content type)
+SCHEMA_FORMATS = {
+    '.json': (OpenAPICodecJson, 'application/json'),
+    '.yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+
+# format: (content, etag), loaded once per worker process
+_schemas = {}
+
+
+def schema_path(format):
+    return os.path.join(settings.DRIVE_SAFE_SCHEMA_DIR,
+                        'openapi-%s%s' % (API_VERSION, format))
+
+
+def generate_schema(format):
+    """
+    Return the public schema of the API encoded in format ('.json' or '.yaml').
+    """
+    generator = OpenAPISchemaGenerator(api_info)
+    codec_class, _ = SCHEMA_FORMATS[format]
+    return codec_class(validators=[]).encode(
+        generator.get_schema(request=None, public=True))
+
+
+def get_schema(format):
+    """
+    Return (content, etag) of the stored schema. A worker without the
+    schema file generates it once and keeps it in memory.
+    """
+    schema = _schemas.get(format)
+    if schema is None:
+        path = schema_path(format)
+        try:
+            with open(path, 'rb') as schema_file:
+                content = schema_file.read()
+        except FileNotFoundError:
+            logger.warning('%s is missing, run manage.py generate_schema', path)
+            content = generate_schema(format)
+        etag = quote_etag(hashlib.sha256(content).hexdigest())
+        schema = _schemas[format] = (content, etag)
+    return schema
+
+
+def reset_schemas():
+    _schemas.clear()
@@ -0,0 +1,57 @@
+"""
+Full-text search over advices and forum questions.
+
+Both models store a precomputed tsvector in search_vector, covered by a GIN
+index and refreshed by the post_save signals in drive_safe.signals. Rows
+written with bulk operations have to be refreshed with
+update_search_vectors(), as does the whole table after a change of
+DRIVE_SAFE_SEARCH_CONFIG (manage.py update_search_vectors).
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from drive_safe.models import Advice, ForumQuestion
+
+
+def get_search_config():
+    return getattr(settings, 'DRIVE_SAFE_SEARCH_CONFIG', 'simple')
+
+
+def get_search_vector(model):
+    """
+    Return the expression computing search_vector of the model. Advice
+    titles weigh more than their text.
+    """
+    config = get_search_config()
+    if model is Advice:
+        return (SearchVector('title', weight='A', config=config)
+                + SearchVector('text', weight='B', config=config))
+    return SearchVector('text', weight='B', config=config)
+
+
+def update_search_vectors(queryset):
+    """
+    Recompute search_vector of every row of an Advice or ForumQuestion
+    queryset with a single UPDATE.
+    """
+    return queryset.update(search_vector=get_search_vector(queryset.model))
+
+
+def search(queryset, text):
+    """
+    Filter the queryset to rows matching the text and annotate them with
+    their rank.
+    """
+    query = SearchQuery(text, config=get_search_config())
+    # ts_rank() returns real, double precision survives the round trip
+    # through a pagination cursor exactly
+    rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+    return queryset.filter(search_vector=query).annotate(rank=rank)
+
+
+SEARCH_MODELS = {
+    'advices': Advice,
+    'forum_questions': ForumQuestion,
+}
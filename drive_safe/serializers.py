@@ -2,17 +2,56 @@ from rest_framework import serializers
 from drive_safe.models import *
 
 
-class AdviceSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Serializer taking an optional fields argument with names of the fields
+    to keep, for ?fields= / ?exclude= requests.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AdviceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Advice
-        exclude = ('passed_by',)
+        exclude = ('passed_by', 'search_vector', 'import_key')
         depth = 1
 
 
 class TestQuestionsSerializer(serializers.ModelSerializer):
     class Meta:
         model = TestQuestions
-        exclude = ('advice', 'correct_answer')
+        exclude = ('advice', 'correct_answer', 'import_key')
+
+
+class TagsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tags
+        fields = '__all__'
+
+
+class TagCountSerializer(serializers.ModelSerializer):
+    advice_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Tags
+        fields = ('id', 'name', 'advice_count')
+
+
+class SyncAdviceSerializer(AdviceSerializer):
+    # pass_count changes with every passed test, offline copies don't keep it
+    class Meta(AdviceSerializer.Meta):
+        exclude = AdviceSerializer.Meta.exclude + ('pass_count',)
+
+
+class SyncTestQuestionsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TestQuestions
+        exclude = ('correct_answer', 'import_key')
 
 
 class TestAnswerSerializer(serializers.Serializer):
@@ -30,18 +69,39 @@ class TestFailedSerializer(serializers.Serializer):
     incorrect_answers = serializers.ListField()
 
 
-class ForumQuestionsSerializer(serializers.ModelSerializer):
+class ForumQuestionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ForumQuestion
-        fields = "__all__"
+        exclude = ('search_vector',)
 
 
-class ForumAnswersSerializer(serializers.ModelSerializer):
+class ForumAnswersSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ForumAnswers
         fields = "__all__"
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username')
+
+
+class ForumThreadSerializer(serializers.Serializer):
+    question = ForumQuestionsSerializer()
+    answers = serializers.DictField()
+    users = UserSummarySerializer(many=True)
+
+
+class SyncSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    more = serializers.BooleanField()
+    tags = TagsSerializer(many=True)
+    advices = SyncAdviceSerializer(many=True)
+    test_questions = SyncTestQuestionsSerializer(many=True)
+    deleted = serializers.DictField(child=serializers.ListField(child=serializers.IntegerField()))
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
@@ -59,6 +119,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ("id", "username", "password",)
 
 
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    user_id = serializers.IntegerField()
+    username = serializers.CharField()
+    score = serializers.IntegerField()
+
+
 class UserInfoSerializer(serializers.ModelSerializer):
     user_score = serializers.StringRelatedField(read_only=True)
 
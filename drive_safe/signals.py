@@ -0,0 +1,170 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from drive_safe.cache import (FORUM_ANSWERS_VERSION_KEY, FORUM_QUESTIONS_VERSION_KEY, invalidate_advice_test,
+                              invalidate_advices, invalidate_collection, invalidate_tags)
+from drive_safe.counters import change_answer_count, change_pass_count, record_activity
+from drive_safe.grading import invalidate_answer_key
+from drive_safe.models import Advice, ForumAnswers, ForumQuestion, Tags, TestPassed, TestQuestions
+from drive_safe.search import update_search_vectors
+from drive_safe.sync import record_changes
+
+
+@receiver(post_save, sender=Advice)
+@receiver(post_delete, sender=Advice)
+def advice_changed(sender, instance, **kwargs):
+    invalidate_advices([instance.pk])
+
+
+@receiver(post_save, sender=Advice)
+@receiver(post_save, sender=ForumQuestion)
+def update_search_vector(sender, instance, **kwargs):
+    update_search_vectors(sender.objects.filter(pk=instance.pk))
+
+
+def touch_advices(advice_ids):
+    # advices are serialized with their tags, their ETags follow updated_at
+    if advice_ids:
+        Advice.objects.filter(pk__in=advice_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Advice.tags.through)
+def advice_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        advice_ids = [instance.pk]
+    elif reverse and action in ('post_add', 'post_remove'):
+        advice_ids = list(pk_set)
+    elif reverse and action == 'pre_clear':
+        # tag.advice_set.clear() does not report the removed advices
+        advice_ids = list(instance.advice_set.values_list('id', flat=True))
+    else:
+        return
+    touch_advices(advice_ids)
+    invalidate_advices(advice_ids)
+    invalidate_tags()
+    record_changes(Advice, advice_ids)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(pre_delete, sender=Tags)
+def tag_changed(sender, instance, **kwargs):
+    # advices are serialized with their tag names
+    advice_ids = list(instance.advice_set.values_list('id', flat=True))
+    touch_advices(advice_ids)
+    invalidate_advices(advice_ids)
+    record_changes(Advice, advice_ids)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=Advice)
+def tag_counts_changed(sender, **kwargs):
+    # deleting an advice removes its tag links without m2m_changed
+    invalidate_tags()
+
+
+@receiver(post_save, sender=Advice)
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=TestQuestions)
+def sync_row_saved(sender, instance, **kwargs):
+    record_changes(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Advice)
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=TestQuestions)
+def sync_row_deleted(sender, instance, **kwargs):
+    record_changes(sender, [instance.pk], deleted=True)
+
+
+@receiver(pre_save, sender=TestQuestions)
+def remember_test_question_advice(sender, instance, **kwargs):
+    # an edited question may have been moved from another advice
+    if instance.pk is not None:
+        instance._stored_advice_id = TestQuestions.objects.filter(
+            pk=instance.pk).values_list('advice_id', flat=True).first()
+
+
+@receiver(post_save, sender=TestQuestions)
+@receiver(post_delete, sender=TestQuestions)
+def test_question_changed(sender, instance, **kwargs):
+    advice_ids = {instance.advice_id, getattr(instance, '_stored_advice_id', None)}
+    for advice_id in advice_ids - {None}:
+        invalidate_advice_test(advice_id)
+        invalidate_answer_key(advice_id)
+
+
+@receiver(post_save, sender=TestPassed)
+def test_passed_created(sender, instance, created, **kwargs):
+    if created:
+        change_pass_count(instance.advice_id, 1)
+
+
+@receiver(post_delete, sender=TestPassed)
+def test_passed_deleted(sender, instance, **kwargs):
+    change_pass_count(instance.advice_id, -1)
+
+
+@receiver(post_save, sender=ForumQuestion)
+@receiver(post_delete, sender=ForumQuestion)
+def forum_question_changed(sender, **kwargs):
+    invalidate_collection(FORUM_QUESTIONS_VERSION_KEY)
+
+
+@receiver(post_save, sender=ForumAnswers)
+@receiver(post_delete, sender=ForumAnswers)
+def forum_answer_changed(sender, **kwargs):
+    invalidate_collection(FORUM_ANSWERS_VERSION_KEY)
+
+
+@receiver(pre_save, sender=ForumAnswers)
+def remember_answer_question(sender, instance, **kwargs):
+    # an edited answer may have been moved from another question
+    if instance.pk is not None:
+        instance._stored_question_id = ForumAnswers.objects.filter(
+            pk=instance.pk).values_list('question_id', flat=True).first()
+
+
+@receiver(post_save, sender=ForumAnswers)
+def forum_answer_saved(sender, instance, created, **kwargs):
+    stored_question_id = getattr(instance, '_stored_question_id', None)
+    if created or stored_question_id is None:
+        change_answer_count(instance.question_id, 1)
+    elif stored_question_id != instance.question_id:
+        change_answer_count(stored_question_id, -1)
+        change_answer_count(instance.question_id, 1)
+    else:
+        record_activity(instance.question_id)
+
+
+@receiver(post_delete, sender=ForumAnswers)
+def forum_answer_deleted(sender, instance, **kwargs):
+    change_answer_count(instance.question_id, -1)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    # runs after django.db.close_old_connections, which only drops connections
+    # past CONN_MAX_AGE or after an error; a connection dropped by the server
+    # while idle would fail the first query of the request
+    if not getattr(settings, 'DRIVE_SAFE_CONN_HEALTH_CHECKS', False):
+        return
+    idle_since = time.monotonic() - getattr(settings, 'DRIVE_SAFE_CONN_HEALTH_CHECK_IDLE', 0)
+    for connection in connections.all():
+        if (connection.connection is not None and not connection.in_atomic_block
+                and getattr(connection, 'drive_safe_used_at', 0) <= idle_since
+                and not connection.is_usable()):
+            connection.close()
+
+
+@receiver(request_finished)
+def record_connections_use(sender, **kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        connection.drive_safe_used_at = now
@@ -0,0 +1,50 @@
+"""
+Streaming of whole collections as one JSON array.
+
+Rows are read with a server-side cursor and serialized chunk by chunk, so
+memory use doesn't grow with the table and the first bytes are sent as soon
+as the first chunk is fetched.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def wants_stream(request):
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def dumps(data):
+    # the same output as rest_framework.renderers.JSONRenderer, which also
+    # escapes the line separators that are invalid in JavaScript strings
+    ret = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False,
+                     separators=(',', ':'))
+    return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+
+def stream_json_array(queryset, serializer_class, chunk_size):
+    yield b'['
+    chunk = []
+    separator = ''
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(dumps(serializer_class(obj).data))
+        if len(chunk) == chunk_size:
+            yield (separator + ','.join(chunk)).encode('utf-8')
+            chunk = []
+            separator = ','
+    if chunk:
+        yield (separator + ','.join(chunk)).encode('utf-8')
+    yield b']'
+
+
+def streaming_response(queryset, serializer_class, chunk_size=None):
+    """
+    Return a response streaming all objects of the queryset serialized with
+    serializer_class as a JSON array.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'DRIVE_SAFE_STREAM_CHUNK_SIZE', 2000)
+    return StreamingHttpResponse(stream_json_array(queryset, serializer_class, chunk_size),
+                                 content_type='application/json')
@@ -0,0 +1,104 @@
+"""
+Delta sync of the offline catalogue: advices, tags and test questions.
+
+Every row has one SyncChange entry, moved to the end of the change sequence
+(a new id) whenever the row is created, changed or deleted; deleted rows
+keep theirs as a tombstone. A client passes the token of its previous sync
+and gets the rows of the entries after it, reading the primary key index.
+
+Writers number their entries under a transaction-level advisory lock held
+until commit, so entries become visible in sequence order and a client
+never skips an entry committed after its token was issued.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.db import connection, router, transaction
+
+from drive_safe.models import Advice, SyncChange, Tags, TestQuestions
+from drive_safe.serializers import SyncAdviceSerializer, SyncTestQuestionsSerializer, TagsSerializer
+from drive_safe.values import ValuesSerializer
+
+# name in the response: (model, serializer of its rows)
+SYNC_MODELS = OrderedDict([
+    ('tags', (Tags, ValuesSerializer(TagsSerializer))),
+    ('advices', (Advice, ValuesSerializer(SyncAdviceSerializer))),
+    ('test_questions', (TestQuestions, ValuesSerializer(SyncTestQuestionsSerializer))),
+])
+SYNC_NAMES = {model: name for name, (model, _) in SYNC_MODELS.items()}
+
+# arbitrary key of the PostgreSQL advisory lock numbering the entries
+SYNC_LOCK_ID = 7400
+
+BATCH_SIZE = 1000
+
+
+def lock_sequence():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SYNC_LOCK_ID])
+
+
+def record_changes(model, object_ids, deleted=False):
+    """
+    Move the entries of the objects to the end of the change sequence.
+    """
+    object_ids = sorted(set(object_ids))
+    if not object_ids:
+        return
+    name = SYNC_NAMES[model]
+    with transaction.atomic():
+        lock_sequence()
+        SyncChange.objects.filter(model=name, object_id__in=object_ids).delete()
+        SyncChange.objects.bulk_create([
+            SyncChange(model=name, object_id=object_id, deleted=deleted)
+            for object_id in object_ids
+        ], batch_size=BATCH_SIZE)
+
+
+def record_missing_changes():
+    """
+    Add entries for rows written without signals, return their number.
+    """
+    created = 0
+    with transaction.atomic():
+        lock_sequence()
+        for name, (model, _) in SYNC_MODELS.items():
+            recorded = SyncChange.objects.filter(model=name).values('object_id')
+            object_ids = model.objects.exclude(pk__in=recorded).order_by('pk').values_list(
+                'pk', flat=True)
+            created += len(SyncChange.objects.bulk_create([
+                SyncChange(model=name, object_id=object_id) for object_id in object_ids
+            ], batch_size=BATCH_SIZE))
+    return created
+
+
+def get_changes(since, limit):
+    """
+    Return at most limit changes after the since token as the data of a
+    SyncSerializer.
+    """
+    # read everything from one database, a lagging replica could miss rows
+    # of entries seen on another one
+    db = router.db_for_read(SyncChange)
+    entries = list(SyncChange.objects.using(db).filter(pk__gt=since).order_by('pk').values_list(
+        'pk', 'model', 'object_id', 'deleted')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = defaultdict(list)
+    deleted = defaultdict(list)
+    for _, name, object_id, is_deleted in entries:
+        (deleted if is_deleted else changed)[name].append(object_id)
+
+    data = OrderedDict([
+        ('token', str(entries[-1][0] if entries else since)),
+        ('more', more),
+    ])
+    for name, (model, values_serializer) in SYNC_MODELS.items():
+        rows = []
+        if changed[name]:
+            # rows deleted in the meantime come back as tombstones next time
+            rows = list(values_serializer.values(
+                model.objects.using(db).filter(pk__in=changed[name]).order_by('pk')))
+        data[name] = values_serializer.to_representation(rows, using=db)
+    data['deleted'] = OrderedDict((name, deleted[name]) for name in SYNC_MODELS)
+    return data
@@ -1,8 +1,47 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from drive_safe.models import ForumQuestion, User, Advice
-from drive_safe.serializers import ForumQuestionsSerializer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from drive_safe.models import (ForumAnswers, ForumQuestion, User, Advice, Tags, TestPassed, TestQuestions,
+                               UserScore)
+from drive_safe.cache import advice_list_key, get_cache
+from drive_safe.grading import AnswerKeyCache, answer_key_cache
+from drive_safe.leaderboard import score_ranking
+from drive_safe.metrics import registry
+from drive_safe.pagination import KeysetPagination
+from drive_safe.renderers import FastJSONRenderer
+from drive_safe.routers import use_primary
+from drive_safe.schema import reset_schemas, schema_path
+from drive_safe.serializers import AdviceSerializer, ForumAnswersSerializer, ForumQuestionsSerializer
+from drive_safe.sync import record_missing_changes
+from drive_safe.values import ValuesSerializer
+from drive_safe.warmup import warm_up
+
+
+def run_on_commit():
+    """
+    Run the transaction.on_commit callbacks of the test transaction, which
+    TestCase rolls back instead of committing.
+    """
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+        callback()
 
 
 class UserTests(APITestCase):
@@ -35,7 +74,7 @@ class AdviceTests(APITestCase):
         data = None
         response = self.client.get(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data['results']), 3)
 
     def test_get_advice_by_id(self):
         """
@@ -48,6 +87,302 @@ class AdviceTests(APITestCase):
         self.assertEqual(response.data.get('id'), self.advice1.id)
 
 
+class TagTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.tags = [Tags.objects.create(name=name) for name in ('rondo', 'noc', 'mgła')]
+        self.advices = [Advice.objects.create(title="test%d" % n, text='test', test_points=0)
+                        for n in range(4)]
+        self.advices[0].tags.add(self.tags[0], self.tags[1])
+        self.advices[1].tags.add(self.tags[0])
+        self.advices[2].tags.add(self.tags[1], self.tags[2])
+
+    def get_advice_ids(self, **params):
+        response = self.client.get(reverse('advices'), params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [advice['id'] for advice in response.data['results']]
+
+    def test_tag_counts(self):
+        """
+            Ensure tags are listed with advice counts from cache until advice tags change.
+        """
+        response = self.client.get(reverse('tags'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(tag['name'], tag['advice_count']) for tag in response.data],
+                         [('mgła', 1), ('noc', 2), ('rondo', 2)])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('tags'), format='json')
+        self.assertEqual(len(queries), 0)
+
+        self.advices[3].tags.add(self.tags[2])
+        self.advices[0].delete()
+        run_on_commit()
+        response = self.client.get(reverse('tags'), format='json')
+        self.assertEqual([(tag['name'], tag['advice_count']) for tag in response.data],
+                         [('mgła', 2), ('noc', 1), ('rondo', 1)])
+
+    def test_filter_by_tags(self):
+        """
+            Ensure advices are filtered by any or all of the given tags.
+        """
+        rondo, noc, _ = (tag.id for tag in self.tags)
+        tags = '%d,%d' % (rondo, noc)
+        self.assertEqual(self.get_advice_ids(tags=tags),
+                         [advice.id for advice in self.advices[:3]])
+        self.assertEqual(self.get_advice_ids(tags=tags, match='all'), [self.advices[0].id])
+        self.assertEqual(self.get_advice_ids(tags=str(rondo), match='all'),
+                         [advice.id for advice in self.advices[:2]])
+
+    def test_invalid_tag_filter(self):
+        """
+            Ensure malformed tag filters are rejected.
+        """
+        for params in ({'tags': 'a,b'}, {'tags': '1', 'match': 'some'}):
+            response = self.client.get(reverse('advices'), params, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdviceBatchTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.advices = [Advice.objects.create(title="test%d" % i, text='test', test_points=0) for i in range(3)]
+        self.advices[0].tags.add(Tags.objects.create(name='rondo'))
+
+    def test_fetch_by_ids(self):
+        """
+            Ensure advices are returned in the requested order with missing ids reported.
+        """
+        missing = self.advices[-1].id + 1
+        ids = [self.advices[2].id, missing, self.advices[0].id, self.advices[2].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('advices'), {'ids': ','.join(map(str, ids))}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([advice['id'] for advice in response.data['results']],
+                         [self.advices[2].id, self.advices[0].id])
+        self.assertEqual(response.data['results'][1]['tags'][0]['name'], 'rondo')
+        self.assertEqual(response.data['missing'], [missing])
+        # ETag state, advices, tags and the current pass counts
+        self.assertEqual(len(queries), 4)
+
+    def test_invalid_ids(self):
+        """
+            Ensure malformed and too long id lists are rejected.
+        """
+        url = reverse('advices')
+        self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(DRIVE_SAFE_MAX_BATCH_IDS=2):
+            self.assertEqual(self.client.get(url, {'ids': '1,2,3'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdviceQueryCountTests(APITestCase):
+    def setUp(self):
+        self.tags = [Tags.objects.create(name="tag%d" % i) for i in range(2)]
+
+    def create_advices(self, number_of_advices):
+        for i in range(number_of_advices):
+            advice = Advice.objects.create(title="test%d" % i, text='test', test_points=0)
+            advice.tags.set(self.tags)
+
+    def count_queries(self, url):
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page_size': 100}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_list_query_count_is_constant(self):
+        """
+            Ensure the number of queries does not grow with the number of advices.
+        """
+        urls = [reverse('advices'), '/advices/tag/%d' % self.tags[0].id]
+        self.create_advices(3)
+        small = [self.count_queries(url) for url in urls]
+        self.create_advices(20)
+        large = [self.count_queries(url) for url in urls]
+        self.assertEqual(small, large)
+
+    def test_detail_query_count(self):
+        """
+            Ensure an advice with tags is fetched with two queries and one ETag query.
+        """
+        self.create_advices(1)
+        url = reverse('advice_detail', args=[Advice.objects.get().id])
+        self.assertEqual(self.count_queries(url), 3)
+
+
+class AdviceCacheTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.tag = Tags.objects.create(name="tag")
+        self.advice = Advice.objects.create(title="test", text='test', test_points=0)
+        self.advice.tags.add(self.tag)
+
+    def get(self, url):
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_cached_endpoints_skip_database(self):
+        """
+            Ensure repeated reads of advice endpoints only query the current pass counts of lists.
+        """
+        urls = [reverse('advice_detail', args=[self.advice.id]), '/advices/test/%d' % self.advice.id]
+        list_urls = [reverse('advices'), '/advices/tag/%d' % self.tag.id]
+        for url in urls + list_urls:
+            self.get(url)
+        with self.assertNumQueries(0):
+            for url in urls:
+                self.get(url)
+        for url in list_urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.get(url)
+            self.assertEqual(len(queries), 1)
+            self.assertIn('"pass_count"', queries[0]['sql'])
+
+    def test_invalidate_on_advice_change(self):
+        """
+            Ensure advice detail and lists are refreshed when an advice changes.
+        """
+        detail_url = reverse('advice_detail', args=[self.advice.id])
+        self.get(detail_url)
+        self.get(reverse('advices'))
+        self.advice.title = 'changed'
+        self.advice.save()
+        Advice.objects.create(title="test2", text='test', test_points=0)
+        # cache entries are dropped once the transaction commits
+        self.assertEqual(self.get(detail_url)['title'], 'test')
+        run_on_commit()
+        self.assertEqual(self.get(detail_url)['title'], 'changed')
+        self.assertEqual(len(self.get(reverse('advices'))['results']), 2)
+
+    def test_invalidate_on_tag_change(self):
+        """
+            Ensure advices and their ETags are refreshed when their tags change.
+        """
+        for url in (reverse('advice_detail', args=[self.advice.id]), reverse('advices')):
+            etag = self.client.get(url, format='json')['ETag']
+            self.tag.name = 'renamed %s' % url
+            self.tag.save()
+            run_on_commit()
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+            self.advice.tags.remove(self.tag)
+            run_on_commit()
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.advice.tags.add(self.tag)
+            run_on_commit()
+        detail = self.get(reverse('advice_detail', args=[self.advice.id]))
+        self.assertEqual(detail['tags'][0]['name'], self.tag.name)
+
+    def test_invalidate_on_test_question_change(self):
+        """
+            Ensure advice test is refreshed when a question is added or deleted.
+        """
+        url = '/advices/test/%d' % self.advice.id
+        self.assertEqual(len(self.get(url)), 0)
+        question = TestQuestions.objects.create(advice=self.advice, question_text='question', answer_a='a',
+                                                answer_b='b', answer_c='c', correct_answer='a')
+        run_on_commit()
+        self.assertEqual(len(self.get(url)), 1)
+        question.delete()
+        run_on_commit()
+        self.assertEqual(len(self.get(url)), 0)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        self.advice = Advice.objects.create(title="test", text='test', test_points=0)
+        self.forum_question = ForumQuestion.objects.create(text='test', advice=self.advice, user=self.user)
+
+    def test_not_modified(self):
+        """
+            Ensure a matching ETag or Last-Modified returns 304 without a body.
+        """
+        url = reverse('advice_detail', args=[self.advice.id])
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=60', response['Cache-Control'])
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(url, format='json', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_collection(self):
+        """
+            Ensure collection ETags change when rows are added, changed or deleted.
+        """
+        url = reverse('forum_questions')
+        etag = self.client.get(url, format='json')['ETag']
+        self.assertNotIn('Last-Modified', self.client.get(url, format='json'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        for change in (lambda: ForumQuestion.objects.create(text='test', advice=self.advice, user=self.user),
+                       lambda: self.forum_question.save(),
+                       lambda: ForumQuestion.objects.latest('id').delete(),
+                       lambda: ForumAnswers.objects.create(text='test', question=self.forum_question,
+                                                           user=self.user)):
+            change()
+            run_on_commit()
+            response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        self.title_match = Advice.objects.create(title="Hamowanie awaryjne", text='test', test_points=0)
+        self.text_match = Advice.objects.create(title="Opony", text='hamowanie na mokrej drodze', test_points=0)
+        Advice.objects.create(title="Parkowanie", text='test', test_points=0)
+        self.forum_question = ForumQuestion.objects.create(text='Jak parkowanie?', advice=self.text_match,
+                                                           user=self.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [result['id'] for result in response.data['results']]
+
+    def test_search_advices(self):
+        """
+            Ensure advices are matched by title and text, title matches first.
+        """
+        self.assertEqual(self.search(q='hamowanie'), [self.title_match.id, self.text_match.id])
+        response = self.client.get(reverse('search'), {'q': 'hamowanie', 'page_size': 1}, format='json')
+        self.assertEqual(response.data['results'][0]['id'], self.title_match.id)
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([result['id'] for result in response.data['results']], [self.text_match.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_search_forum_questions(self):
+        """
+            Ensure forum questions are searched with the forum_questions scope.
+        """
+        self.assertEqual(self.search(q='parkowanie', scope='forum_questions'), [self.forum_question.id])
+
+    def test_search_follows_changes(self):
+        """
+            Ensure search vectors are refreshed when an advice is edited.
+        """
+        self.text_match.text = 'test'
+        self.text_match.save()
+        self.assertEqual(self.search(q='hamowanie'), [self.title_match.id])
+
+    def test_invalid_search(self):
+        """
+            Ensure a missing phrase or unknown scope is rejected.
+        """
+        for params in ({}, {'q': 'test', 'scope': 'users'}):
+            response = self.client.get(reverse('search'), params, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ForumTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
@@ -83,7 +418,7 @@ class ForumTests(APITestCase):
         data = None
         response = self.client.get(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(response.data['results']), 4)
 
     def test_get_forum_question_by_id(self):
         """
@@ -115,3 +450,1141 @@ class ForumTests(APITestCase):
         response = self.client.delete(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(ForumQuestion.objects.filter(id=self.forum_question1.id).exists())
+
+    def test_stream_forum_questions(self):
+        """
+            Ensure ?stream=true streams every forum question as one JSON array in chunks.
+        """
+        with self.settings(DRIVE_SAFE_STREAM_CHUNK_SIZE=3):
+            response = self.client.get(reverse('forum_questions'), {'stream': 'true'})
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 4)
+        page = self.client.get(reverse('forum_questions'), format='json')
+        self.assertEqual(json.loads(b''.join(chunks).decode()), page.json()['results'])
+
+    def test_stream_escapes_line_separators(self):
+        """
+            Ensure streamed JSON escapes U+2028 and U+2029 like the paginated response.
+        """
+        ForumQuestion.objects.all().delete()
+        ForumQuestion.objects.create(text='linia\u2028akapit\u2029ź', advice=self.advice, user=self.user)
+        content = b''.join(self.client.get(reverse('forum_questions'), {'stream': 'true'}).streaming_content)
+        self.assertIn(b'linia\\u2028akapit\\u2029\xc5\xba', content)
+        page = self.client.get(reverse('forum_questions'), format='json')
+        self.assertEqual(json.loads(content.decode()), page.json()['results'])
+
+    def test_stream_empty_forum_answers(self):
+        """
+            Ensure an empty collection is streamed as an empty array.
+        """
+        response = self.client.get(reverse('forum_answers'), {'stream': '1'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        self.advice = Advice.objects.create(title="test", text='test', test_points=1)
+        self.question = ForumQuestion.objects.create(text='pytanie', advice=self.advice, user=self.user)
+
+    def test_pass_count(self):
+        """
+            Ensure a passed test increments the advice pass count shown by the advice views
+            without invalidating the cached advice lists.
+        """
+        url = reverse('advice_detail', args=[self.advice.id])
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['pass_count'], 0)
+        detail_etag = response['ETag']
+        response = self.client.get(reverse('advices'), format='json')
+        self.assertEqual(response.data['results'][0]['pass_count'], 0)
+        list_etag = response['ETag']
+        list_key = advice_list_key(response.wsgi_request)
+        response = self.client.post('/test_check/%d/%d' % (self.user.id, self.advice.id), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_on_commit()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.data['pass_count'], 1)
+        self.assertIsNotNone(get_cache().get(list_key))
+        response = self.client.get(reverse('advices'), format='json', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['pass_count'], 1)
+        TestPassed.objects.get().delete()
+        self.assertEqual(Advice.objects.get().pass_count, 0)
+
+    def test_answer_count(self):
+        """
+            Ensure answer count and last activity follow created, moved and deleted answers.
+        """
+        other = ForumQuestion.objects.create(text='inne', advice=self.advice, user=self.user)
+        before = ForumQuestion.objects.get(pk=self.question.pk).last_activity
+        response = self.client.post(reverse('forum_answers'), {
+            'text': 'odpowiedź', 'question': self.question.id, 'user': self.user.id}, format='json')
+        detail = self.client.get(reverse('forum_question_detail', args=[self.question.id]), format='json')
+        self.assertEqual(detail.data['answer_count'], 1)
+        self.assertGreater(ForumQuestion.objects.get(pk=self.question.pk).last_activity, before)
+
+        answer_url = '/forum_answers/%d' % response.data['id']
+        self.client.put(answer_url, dict(response.data, question=other.id), format='json')
+        self.assertEqual(list(ForumQuestion.objects.order_by('id').values_list('answer_count', flat=True)), [0, 1])
+        self.client.delete(answer_url)
+        self.assertEqual(ForumQuestion.objects.get(pk=other.pk).answer_count, 0)
+
+    def test_reconcile_counters(self):
+        """
+            Ensure drifted counters are fixed by the reconcile command.
+        """
+        TestPassed.objects.bulk_create([TestPassed(user=self.user, advice=self.advice)])
+        ForumAnswers.objects.bulk_create([
+            ForumAnswers(text='odpowiedź', question=self.question, user=self.user) for _ in range(2)])
+        ForumQuestion.objects.update(last_activity='2019-01-01T00:00:00Z')
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(Advice.objects.get().pass_count, 1)
+        question = ForumQuestion.objects.get()
+        self.assertEqual(question.answer_count, 2)
+        self.assertEqual(question.last_activity, ForumAnswers.objects.latest('updated_at').updated_at)
+
+
+class ForumFilterTests(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username='user%d' % i) for i in range(2)]
+        self.advices = [Advice.objects.create(title="test", text='test', test_points=0) for _ in range(2)]
+        self.questions = [
+            ForumQuestion.objects.create(text='pytanie', advice=advice, user=user)
+            for advice in self.advices for user in self.users
+        ]
+        ForumQuestion.objects.filter(pk=self.questions[0].pk).update(date_added='2019-01-01')
+        for question in self.questions[:2]:
+            ForumAnswers.objects.create(text='odpowiedź', question=question, user=self.users[1])
+
+    def get_ids(self, url, params):
+        response = self.client.get(url, params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_filter_questions(self):
+        """
+            Ensure forum questions are filtered by advice, user and date range in stable order.
+        """
+        url = reverse('forum_questions')
+        self.assertEqual(self.get_ids(url, {'advice': self.advices[0].id}),
+                         [self.questions[0].id, self.questions[1].id])
+        self.assertEqual(self.get_ids(url, {'advice': self.advices[1].id, 'user': self.users[0].id}),
+                         [self.questions[2].id])
+        self.assertEqual(self.get_ids(url, {'date_to': '2019-12-31'}), [self.questions[0].id])
+        self.assertEqual(self.get_ids(url, {'date_from': '2020-01-01', 'page_size': 2,
+                                            'advice': self.advices[0].id}),
+                         [self.questions[1].id])
+
+    def test_filter_answers(self):
+        """
+            Ensure forum answers are filtered by question and user.
+        """
+        url = reverse('forum_answers')
+        self.assertEqual(len(self.get_ids(url, {'question': self.questions[0].id})), 1)
+        self.assertEqual(len(self.get_ids(url, {'user': self.users[1].id})), 2)
+        self.assertEqual(self.get_ids(url, {'user': self.users[0].id}), [])
+
+    def test_invalid_filter(self):
+        """
+            Ensure malformed filter values are rejected.
+        """
+        url = reverse('forum_questions')
+        self.assertEqual(self.client.get(url, {'advice': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'date_from': '2019-02-30'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class ForumThreadTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='adam', password='gdssgtrf234ds')
+        advice = Advice.objects.create(title="test", text='test', test_points=0)
+        self.question = ForumQuestion.objects.create(text='pytanie', advice=advice, user=self.author)
+        self.url = reverse('forum_thread', args=[self.question.id])
+
+    def add_answers(self, number):
+        for i in range(number):
+            user = User.objects.create(username='user%d' % ForumAnswers.objects.count())
+            ForumAnswers.objects.create(text='odpowiedź', question=self.question, user=user)
+
+    def test_thread(self):
+        """
+            Ensure a thread returns the question, a page of answers and their authors.
+        """
+        self.add_answers(3)
+        response = self.client.get(self.url, {'page_size': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['question']['id'], self.question.id)
+        self.assertEqual(len(response.data['answers']['results']), 2)
+        self.assertIsNotNone(response.data['answers']['next'])
+        self.assertEqual([user['username'] for user in response.data['users']], ['adam', 'user0', 'user1'])
+
+    def test_thread_queries(self):
+        """
+            Ensure the number of queries doesn't depend on the number of answers.
+        """
+        self.add_answers(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url, format='json')
+        self.add_answers(10)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url, format='json')
+        self.assertEqual(len(few), len(many))
+        # the ETag state, the question with its author, the answers with theirs
+        self.assertEqual(len(many), 3)
+
+    def test_thread_etag(self):
+        """
+            Ensure the thread ETag changes when an answer is added or changed.
+        """
+        etag = self.client.get(self.url, format='json')['ETag']
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.add_answers(1)
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        ForumAnswers.objects.update(text='zmieniona', updated_at=timezone.now())
+        response = self.client.get(self.url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_thread(self):
+        """
+            Ensure a thread of a missing question is not found.
+        """
+        response = self.client.get(reverse('forum_thread', args=[self.question.id + 1]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.tag = Tags.objects.create(name='rondo')
+        self.advice = Advice.objects.create(title="test", text='test', test_points=2)
+        self.advice.tags.add(self.tag)
+        self.question = TestQuestions.objects.create(advice=self.advice, question_text='question',
+                                                     answer_a='a', answer_b='b', answer_c='c',
+                                                     correct_answer='a')
+
+    def sync(self, since=None):
+        params = {} if since is None else {'since': since}
+        response = self.client.get(reverse('sync'), params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync(self):
+        """
+            Ensure a sync without a token returns the whole catalogue.
+        """
+        data = self.sync()
+        self.assertFalse(data['more'])
+        self.assertEqual(data['tags'], [{'id': self.tag.id, 'name': 'rondo'}])
+        self.assertEqual([advice['id'] for advice in data['advices']], [self.advice.id])
+        self.assertEqual(data['advices'][0]['tags'], [{'id': self.tag.id, 'name': 'rondo'}])
+        self.assertNotIn('pass_count', data['advices'][0])
+        self.assertEqual(data['test_questions'][0]['advice'], self.advice.id)
+        self.assertNotIn('correct_answer', data['test_questions'][0])
+
+    def test_delta_sync(self):
+        """
+            Ensure a sync with a token returns only changed rows and tombstones of deleted ones.
+        """
+        token = self.sync()['token']
+        data = self.sync(token)
+        self.assertEqual(data['token'], token)
+        self.assertEqual((data['tags'], data['advices'], data['test_questions']), ([], [], []))
+
+        self.tag.name = 'skrzyżowanie'
+        self.tag.save()
+        question_id = self.question.id
+        self.question.delete()
+        data = self.sync(token)
+        self.assertEqual([tag['name'] for tag in data['tags']], ['skrzyżowanie'])
+        self.assertEqual(data['advices'][0]['tags'][0]['name'], 'skrzyżowanie')
+        self.assertEqual(data['test_questions'], [])
+        self.assertEqual(data['deleted'], {'tags': [], 'advices': [], 'test_questions': [question_id]})
+
+        # passing a test doesn't change the synced advice
+        token = data['token']
+        user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        TestPassed.objects.create(user=user, advice=self.advice)
+        self.assertEqual(self.sync(token)['advices'], [])
+
+    def test_sync_in_pages(self):
+        """
+            Ensure a limited sync is continued until more is false and returns every row once.
+        """
+        Tags.objects.bulk_create([Tags(name='tag%d' % n) for n in range(4)])
+        record_missing_changes()
+        tag_ids = []
+        token = None
+        with self.settings(DRIVE_SAFE_SYNC_LIMIT=2):
+            while True:
+                data = self.sync(token)
+                tag_ids.extend(tag['id'] for tag in data['tags'])
+                token = data['token']
+                if not data['more']:
+                    break
+        self.assertEqual(sorted(tag_ids), list(Tags.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_invalid_token(self):
+        """
+            Ensure a malformed token is rejected.
+        """
+        for since in ('abc', '-1'):
+            response = self.client.get(reverse('sync'), {'since': since}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        self.advices = [
+            Advice.objects.create(title="test%d" % i, text='test', test_points=0)
+            for i in range(5)
+        ]
+
+    def test_walk_pages_with_cursor(self):
+        """
+            Ensure the cursor walks all advices once, in (date_added, id) order.
+        """
+        url = reverse('advices')
+        ids = []
+        data = {'page_size': 2}
+        while url:
+            response = self.client.get(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.extend(advice['id'] for advice in response.data['results'])
+            url = response.data['next']
+            data = None
+        self.assertEqual(ids, [advice.id for advice in self.advices])
+
+    def test_page_size_is_bounded(self):
+        """
+            Ensure the requested page size is capped by the maximum.
+        """
+        url = reverse('advices')
+        with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+            response = self.client.get(url, {'page_size': 1000}, format='json')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        """
+            Ensure a tampered cursor returns 404.
+        """
+        url = reverse('advices')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestCheckTests(APITestCase):
+    def setUp(self):
+        answer_key_cache.clear()
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        UserScore.objects.create(user=self.user)
+
+    def create_test(self, number_of_questions, test_points=5):
+        advice = Advice.objects.create(title="test", text='test', test_points=test_points)
+        questions = [
+            TestQuestions.objects.create(advice=advice, question_text='question', answer_a='a',
+                                         answer_b='b', answer_c='c', correct_answer='a')
+            for _ in range(number_of_questions)
+        ]
+        return advice, questions
+
+    def submit(self, advice, answers):
+        url = '/test_check/%d/%d' % (self.user.id, advice.id)
+        return self.client.post(url, answers, format='json')
+
+    def test_pass_test(self):
+        """
+            Ensure correct answers pass the test and add points.
+        """
+        advice, questions = self.create_test(3)
+        answers = [{'question_id': question.id, 'question_answer': 'A'} for question in questions]
+        response = self.submit(advice, answers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(TestPassed.objects.filter(user=self.user, advice=advice).exists())
+        self.assertEqual(UserScore.objects.get(user=self.user).score, 5)
+
+    def test_fail_test(self):
+        """
+            Ensure incorrect answers are reported in submission order.
+        """
+        advice, questions = self.create_test(3)
+        answers = [{'question_id': question.id, 'question_answer': 'b'} for question in questions]
+        response = self.submit(advice, answers[::-1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['incorrect_answers'], [question.id for question in questions[::-1]])
+        self.assertEqual(UserScore.objects.get(user=self.user).score, 0)
+
+    def test_reject_invalid_submission(self):
+        """
+            Ensure foreign, repeated and missing answers are rejected.
+        """
+        advice, questions = self.create_test(2)
+        other_advice, other_questions = self.create_test(1)
+        invalid_submissions = [
+            [{'question_id': questions[0].id, 'question_answer': 'a'},
+             {'question_id': other_questions[0].id, 'question_answer': 'a'}],
+            [{'question_id': questions[0].id, 'question_answer': 'a'},
+             {'question_id': questions[0].id, 'question_answer': 'a'}],
+            [{'question_id': questions[0].id, 'question_answer': 'a'}],
+        ]
+        for answers in invalid_submissions:
+            response = self.submit(advice, answers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TestPassed.objects.exists())
+
+    def test_query_count_does_not_depend_on_number_of_questions(self):
+        """
+            Ensure grading runs a fixed number of queries.
+        """
+        query_counts = []
+        for number_of_questions in (3, 30):
+            advice, questions = self.create_test(number_of_questions)
+            answers = [{'question_id': question.id, 'question_answer': 'a'} for question in questions]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.submit(advice, answers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        # advice, user, the pass check, the answer key, then in a savepoint the
+        # pass insert, the pass_count update, the score increment and its re-read,
+        # with a score row the user has since registering
+        self.assertLessEqual(query_counts[1], 10)
+
+    def test_pass_test_without_score(self):
+        """
+            Ensure a user without a score row gets one and a place in the ranking.
+        """
+        user = User.objects.create(username='ewa', password='gdssgtrf234ds')
+        score_ranking.reset()
+        score_ranking.rank(0)
+        advice, questions = self.create_test(1, test_points=7)
+        response = self.client.post('/test_check/%d/%d' % (user.id, advice.id),
+                                    [{'question_id': questions[0].id, 'question_answer': 'a'}],
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(UserScore.objects.get(user=user).score, 7)
+        self.assertEqual(score_ranking.rank(7), 1)
+
+    def test_answer_key_is_cached(self):
+        """
+            Ensure the answer key is read once and reloaded after a question change commits.
+        """
+        advice, questions = self.create_test(2)
+        answers = [{'question_id': question.id, 'question_answer': 'b'} for question in questions]
+        self.submit(advice, answers)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit(advice, answers)
+        self.assertEqual(response.data['incorrect_answers'], [question.id for question in questions])
+        self.assertFalse(any('drive_safe_testquestions' in query['sql'] for query in queries))
+
+        questions[0].correct_answer = 'b'
+        questions[0].save()
+        self.assertEqual(self.submit(advice, answers).data['incorrect_answers'],
+                         [question.id for question in questions])
+        run_on_commit()
+        response = self.submit(advice, answers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['incorrect_answers'], [questions[1].id])
+
+    def test_answer_key_expires(self):
+        """
+            Ensure answer keys are reloaded after their TTL.
+        """
+        cache = AnswerKeyCache(max_size=2, ttl=60)
+        cache.set(1, 'v1', ((1, 'A'),))
+        self.assertEqual(cache.get(1, 'v1'), ((1, 'A'),))
+        with mock.patch('drive_safe.grading.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(1, 'v1'))
+
+
+# the replica test database stays empty, these tests read what they wrote
+@override_settings(DRIVE_SAFE_REPLICAS=[])
+class TestCheckConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_submissions_score_exactly(self):
+        """
+            Ensure concurrent submissions add the points of every test exactly once.
+        """
+        user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        UserScore.objects.create(user=user)
+        submissions = []
+        for test_points in range(1, 9):
+            advice = Advice.objects.create(title="test", text='test', test_points=test_points)
+            question = TestQuestions.objects.create(advice=advice, question_text='question', answer_a='a',
+                                                    answer_b='b', answer_c='c', correct_answer='a')
+            url = '/test_check/%d/%d' % (user.id, advice.id)
+            answers = [{'question_id': question.id, 'question_answer': 'a'}]
+            # every test is submitted several times at once
+            submissions.extend([(url, answers)] * 4)
+
+        barrier = threading.Barrier(len(submissions))
+        status_codes = []
+
+        def submit(url, answers):
+            try:
+                barrier.wait()
+                response = APIClient().post(url, answers, format='json')
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=submission) for submission in submissions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes.count(status.HTTP_201_CREATED), 8)
+        self.assertEqual(status_codes.count(status.HTTP_400_BAD_REQUEST), 24)
+        self.assertEqual(TestPassed.objects.filter(user=user).count(), 8)
+        self.assertEqual(UserScore.objects.get(user=user).score, sum(range(1, 9)))
+
+    def test_concurrent_first_passes(self):
+        """
+            Ensure concurrent first passes of different tests by a user without a score row all count.
+        """
+        for attempt in range(5):
+            user = User.objects.create(username='ewa%d' % attempt, password='gdssgtrf234ds')
+            submissions = []
+            for test_points in (3, 4):
+                advice = Advice.objects.create(title="test", text='test', test_points=test_points)
+                question = TestQuestions.objects.create(advice=advice, question_text='question',
+                                                        answer_a='a', answer_b='b', answer_c='c',
+                                                        correct_answer='a')
+                submissions.append(('/test_check/%d/%d' % (user.id, advice.id),
+                                    [{'question_id': question.id, 'question_answer': 'a'}]))
+
+            barrier = threading.Barrier(len(submissions))
+            status_codes = []
+
+            def submit(url, answers):
+                try:
+                    barrier.wait()
+                    status_codes.append(APIClient().post(url, answers, format='json').status_code)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=submit, args=submission) for submission in submissions]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(status_codes, [status.HTTP_201_CREATED] * 2)
+            self.assertEqual(TestPassed.objects.filter(user=user).count(), 2)
+            self.assertEqual(UserScore.objects.get(user=user).score, 7)
+
+
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        score_ranking.reset()
+        self.users = []
+        for i, score in enumerate([10, 30, 20, 30, 0]):
+            user = User.objects.create(username='user%d' % i, password='gdssgtrf234ds')
+            UserScore.objects.create(user=user, score=score)
+            self.users.append(user)
+
+    def get(self, **params):
+        response = self.client.get(reverse('leaderboard'), params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_top_users(self):
+        """
+            Ensure the best users are listed with shared ranks for equal scores.
+        """
+        top = self.get(limit=4)['top']
+        self.assertEqual([(entry['username'], entry['rank']) for entry in top],
+                         [('user1', 1), ('user3', 1), ('user2', 3), ('user0', 4)])
+
+    def test_my_rank(self):
+        """
+            Ensure the rank of a user is read without counting rows and follows new points.
+        """
+        self.get(user_id=self.users[0].id)
+        with CaptureQueriesContext(connection) as queries:
+            me = self.get(user_id=self.users[0].id)['me']
+        self.assertEqual(me['rank'], 4)
+        self.assertFalse(any('COUNT' in query['sql'] for query in queries))
+
+        advice = Advice.objects.create(title="test", text='test', test_points=15)
+        self.client.post('/test_check/%d/%d' % (self.users[0].id, advice.id), [], format='json')
+        self.assertEqual(self.get(user_id=self.users[0].id)['me']['rank'], 3)
+        self.assertEqual(self.get(user_id=self.users[2].id)['me']['rank'], 4)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # the replica test database is never written to, a replica that hasn't
+    # replayed any of the writes of the tests yet
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        self.advice = Advice.objects.create(title="test", text='test', test_points=0)
+        get_cache().clear()
+        self.client = APIClient()
+
+    def get_queries(self, method, path, data=None):
+        """
+            Return numbers of queries run on default and replica by a request.
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            getattr(self.client, method)(path, data, format='json')
+        return len(primary), len(replica)
+
+    def test_reads_use_replica(self):
+        """
+            Ensure GET requests read from the replica only.
+        """
+        primary, replica = self.get_queries('get', reverse('advices'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_read_your_writes(self):
+        """
+            Ensure writes go to default and pin the client's reads to it for a while.
+        """
+        primary, replica = self.get_queries('post', reverse('forum_questions'), {
+            'text': 'pytanie', 'advice': self.advice.id, 'user': self.user.id})
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertIn('drive_safe_primary', self.client.cookies)
+
+        primary, replica = self.get_queries('get', reverse('forum_questions'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.client.cookies.clear()
+        primary, replica = self.get_queries('get', reverse('forum_questions'))
+        self.assertEqual(primary, 0)
+
+    def test_replica_lags(self):
+        """
+            Ensure reads without a recent write see the replica, which doesn't have the new rows yet.
+        """
+        response = self.client.get(reverse('advice_detail', args=[self.advice.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        with use_primary():
+            response = self.client.get(reverse('advice_detail', args=[self.advice.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_miss_after_write_reads_default(self):
+        """
+            Ensure responses cached right after an invalidation are computed on default.
+        """
+        response = self.client.get(reverse('advices'))
+        self.assertEqual(response.data['results'], [])
+        advice = Advice.objects.create(title="nowa", text='test', test_points=0)
+        response = APIClient().get(reverse('advices'))
+        self.assertIn(advice.id, [result['id'] for result in response.data['results']])
+
+    def test_write_pins_only_invalidated_keys(self):
+        """
+            Ensure only misses of the keys invalidated by a write read from default.
+        """
+        Advice.objects.create(title="nowa", text='test', test_points=0)
+        primary, replica = self.get_queries('get', reverse('advices'))
+        self.assertGreater(primary, 0)
+        # only the uncached pass counts
+        self.assertEqual(replica, 1)
+        primary, replica = self.get_queries('get', '/advices/test/%d' % self.advice.id)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_stream_read_your_writes(self):
+        """
+            Ensure a streamed list is read from default when the client is pinned to it.
+        """
+        response = self.client.post(reverse('forum_questions'), {
+            'text': 'pytanie', 'advice': self.advice.id, 'user': self.user.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse('forum_questions'), {'stream': 'true'})
+        data = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual([question['text'] for question in data], ['pytanie'])
+
+    def test_collection_etag_waits_for_replica(self):
+        """
+            Ensure a forum list read from the replica gets no ETag until the replica can have the last change.
+        """
+        url = reverse('forum_questions')
+        self.assertIn('ETag', self.client.get(url))
+        ForumQuestion.objects.create(text='pytanie', advice=self.advice, user=self.user)
+        self.assertNotIn('ETag', self.client.get(url))
+        with mock.patch('drive_safe.conditional.time.time', return_value=time.time() + 11):
+            self.assertIn('ETag', self.client.get(url))
+
+    def test_transactions_read_default(self):
+        """
+            Ensure reads inside a transaction see its own rows on default.
+        """
+        with transaction.atomic():
+            Tags.objects.create(name='rondo')
+            self.assertEqual(Tags.objects.all().db, 'default')
+            self.assertTrue(Tags.objects.filter(name='rondo').exists())
+        self.assertEqual(Tags.objects.all().db, 'replica')
+
+
+@override_settings(DRIVE_SAFE_REPLICAS=[])
+class WarmUpTests(TransactionTestCase):
+    # the warm-up connects to every database
+    multi_db = True
+
+    def setUp(self):
+        answer_key_cache.clear()
+        score_ranking.reset()
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        UserScore.objects.create(user=self.user)
+        self.advice = Advice.objects.create(title="test", text='test', test_points=5)
+        self.questions = [
+            TestQuestions.objects.create(advice=self.advice, question_text='question', answer_a='a',
+                                         answer_b='b', answer_c='c', correct_answer='a')
+            for _ in range(2)
+        ]
+
+    def test_warm_up(self):
+        """
+            Ensure the warm-up opens connections, fills the answer keys and the ranking and loads the schema.
+        """
+        for alias in connections:
+            connections[alias].close()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        reset_schemas()
+        self.addCleanup(reset_schemas)
+        with self.settings(DRIVE_SAFE_SCHEMA_DIR=directory), \
+                self.assertLogs('drive_safe.schema', 'WARNING'):
+            warm_up()
+        for alias in connections:
+            self.assertIsNotNone(connections[alias].connection)
+        answers = [{'question_id': question.id, 'question_answer': 'a'} for question in self.questions]
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/test_check/%d/%d' % (self.user.id, self.advice.id),
+                                        answers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(any('drive_safe_testquestions' in query['sql'] for query in queries))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(score_ranking.rank(5), 1)
+        self.assertEqual(len(queries), 0)
+
+    def test_warm_up_failure_is_logged(self):
+        """
+            Ensure a failing warm-up step doesn't stop the worker from starting.
+        """
+        with mock.patch('drive_safe.warmup.score_ranking.rank', side_effect=DatabaseError), \
+                mock.patch('drive_safe.warmup.load_schemas'), \
+                self.assertLogs('drive_safe.warmup', 'ERROR'):
+            warm_up()
+
+    def test_unusable_connection_is_closed(self):
+        """
+            Ensure an idle connection failing its health check is replaced at the start of a request
+            and a recently used one is not checked.
+        """
+        # a persistent connection, not closed by django.db.close_old_connections
+        connection.close()
+        self.addCleanup(connection.close)
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 600}):
+            connection.ensure_connection()
+        request_finished.send(sender=self.__class__)
+        with mock.patch.object(connection, 'is_usable', return_value=False) as is_usable:
+            request_started.send(sender=self.__class__)
+            is_usable.assert_not_called()
+            self.assertIsNotNone(connection.connection)
+            with mock.patch('drive_safe.signals.time.monotonic', return_value=time.monotonic() + 31):
+                request_started.send(sender=self.__class__)
+        self.assertIsNone(connection.connection)
+        self.assertTrue(User.objects.using('default').exists())
+
+
+@override_settings(DRIVE_SAFE_REPLICAS=[])
+class BenchmarkCommandTests(TransactionTestCase):
+
+    def test_seed_and_benchmark(self):
+        """
+            Ensure synthetic data is seeded and every endpoint is benchmarked.
+        """
+        call_command('seed_data', advices=5, tags=3, questions_per_advice=2, users=4, passes_per_user=2,
+                     forum_questions=6, answers_per_question=2, seed=1, stdout=StringIO())
+        self.assertEqual(Advice.objects.count(), 5)
+        self.assertEqual(TestQuestions.objects.count(), 10)
+        self.assertEqual(TestPassed.objects.count(), 8)
+        self.assertEqual(ForumAnswers.objects.count(), 12)
+        self.assertFalse(Advice.objects.filter(search_vector__isnull=True).exists())
+        for user_score in UserScore.objects.all():
+            passed = Advice.objects.filter(testpassed__user=user_score.user_id)
+            self.assertEqual(user_score.score, sum(advice.test_points for advice in passed))
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark', iterations=3, warmup=0, output=output, endpoint=['advice'],
+                         host='testserver', stdout=StringIO(), stderr=StringIO())
+            with open(output) as result_file:
+                report = json.load(result_file)
+        self.assertIn('advices', report['endpoints'])
+        advices = report['endpoints']['advices']
+        self.assertEqual(advices['status_codes'], [200])
+        self.assertLessEqual(advices['latency_ms']['p50'], advices['latency_ms']['p99'])
+
+
+class ValuesSerializerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        tags = [Tags.objects.create(name='rondo'), Tags.objects.create(name='noc\u2028ć')]
+        for i in range(3):
+            advice = Advice.objects.create(title="Porada %d" % i, text='Tekst "ż"', test_points=i)
+            advice.tags.set(tags[:i])
+            question = ForumQuestion.objects.create(text='pytanie', advice=advice, user=self.user)
+            ForumAnswers.objects.create(text='odpowiedź', question=question, user=self.user)
+
+    def test_same_output_as_serializers(self):
+        """
+            Ensure values() serialization renders the same bytes as the model serializers.
+        """
+        cases = (
+            (Advice.objects.prefetch_related('tags'), AdviceSerializer),
+            (ForumQuestion.objects.all(), ForumQuestionsSerializer),
+            (ForumAnswers.objects.all(), ForumAnswersSerializer),
+        )
+        for queryset, serializer_class in cases:
+            queryset = queryset.order_by('id')
+            expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+            values_serializer = ValuesSerializer(serializer_class)
+            data = values_serializer.to_representation(list(values_serializer.values(queryset)))
+            self.assertEqual(JSONRenderer().render(data), expected)
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    def test_advice_list_queries(self):
+        """
+            Ensure a page of advices is read with one query for rows, one for tags and one for pass counts.
+        """
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('advices'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([len(advice['tags']) for advice in response.json()['results']], [0, 1, 2])
+        self.assertEqual(len(queries), 4)
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='adam', password='gdssgtrf234ds')
+        self.advice = Advice.objects.create(title="Porada", text='Długi tekst', test_points=1)
+        self.advice.tags.add(Tags.objects.create(name='rondo'))
+        self.question = ForumQuestion.objects.create(text='pytanie', advice=self.advice, user=self.user)
+
+    def test_advice_list_fields(self):
+        """
+            Ensure ?fields= trims advices and the selected columns, without a tags query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('advices'), {'fields': 'id,title'}, format='json')
+        self.assertEqual(response.json()['results'], [{'id': self.advice.id, 'title': 'Porada'}])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"text"', queries[-1]['sql'])
+
+    def test_advice_detail_exclude(self):
+        """
+            Ensure ?exclude= drops fields of a single advice and leaves the full one cached.
+        """
+        url = reverse('advice_detail', args=[self.advice.id])
+        response = self.client.get(url, {'exclude': 'text'}, format='json')
+        self.assertEqual(list(response.json()),
+                         ['id', 'title', 'date_added', 'updated_at', 'test_points', 'pass_count', 'tags'])
+        self.assertEqual(response.json()['tags'], [{'id': self.advice.tags.get().id, 'name': 'rondo'}])
+        self.assertIn('text', self.client.get(url, format='json').json())
+
+    def test_forum_fields(self):
+        """
+            Ensure forum lists, details and streams accept ?fields=.
+        """
+        response = self.client.get(reverse('forum_questions'), {'fields': 'id,advice'}, format='json')
+        self.assertEqual(response.json()['results'], [{'id': self.question.id, 'advice': self.advice.id}])
+        url = reverse('forum_question_detail', args=[self.question.id])
+        self.assertEqual(self.client.get(url, {'fields': 'text'}, format='json').json(), {'text': 'pytanie'})
+        response = self.client.get(reverse('forum_questions'), {'stream': 'true', 'fields': 'user'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode()), [{'user': self.user.id}])
+
+    def test_unknown_field(self):
+        """
+            Ensure unknown field names are rejected.
+        """
+        response = self.client.get(reverse('advices'), {'fields': 'title,passed_by'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'fields': 'Unknown fields: passed_by'})
+
+
+class ImportAdvicesTests(APITestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def import_file(self, name, content, **options):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as import_file:
+            import_file.write(content)
+        call_command('import_advices', path, stdout=StringIO(), **options)
+
+    @staticmethod
+    def record(key, title, tags, questions):
+        return json.dumps({
+            'key': key, 'title': title, 'text': 'Tekst %s' % title, 'test_points': 2, 'tags': tags,
+            'questions': [
+                {'question_text': text, 'answer_a': 'a', 'answer_b': 'b', 'answer_c': 'c',
+                 'correct_answer': 'B'}
+                for text in questions
+            ],
+        })
+
+    def test_import_jsonl(self):
+        """
+            Ensure advices, tags and questions are imported and a repeated import updates them.
+        """
+        Tags.objects.create(name='rondo')
+        lines = [self.record('a-%d' % n, 'Porada %d' % n, ['rondo', 'noc'], ['P1', 'P2']) for n in range(5)]
+        self.import_file('advices.jsonl', '\n'.join(lines), batch_size=2)
+        self.assertEqual(Advice.objects.count(), 5)
+        self.assertEqual(Tags.objects.count(), 2)
+        self.assertEqual(Advice.tags.through.objects.count(), 10)
+        self.assertEqual(TestQuestions.objects.filter(correct_answer='b').count(), 10)
+        self.assertFalse(Advice.objects.filter(search_vector__isnull=True).exists())
+
+        advice = Advice.objects.get(import_key='a-0')
+        question_ids = set(advice.testquestions_set.values_list('id', flat=True))
+        lines[0] = self.record('a-0', 'Zmieniona', ['noc'], ['P1', 'P2', 'P3'])
+        lines[1] = self.record('a-1', 'Porada 1', ['rondo', 'noc'], ['P1'])
+        with CaptureQueriesContext(connection) as unchanged:
+            self.import_file('advices.jsonl', '\n'.join(lines[2:]))
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+                             for query in unchanged.captured_queries))
+        self.import_file('advices.jsonl', '\n'.join(lines))
+        self.assertEqual(Advice.objects.count(), 5)
+        advice.refresh_from_db()
+        self.assertEqual(advice.title, 'Zmieniona')
+        self.assertEqual([tag.name for tag in advice.tags.all()], ['noc'])
+        self.assertTrue(question_ids < set(advice.testquestions_set.values_list('id', flat=True)))
+        self.assertEqual(TestQuestions.objects.filter(advice__import_key='a-1').count(), 1)
+
+    def test_import_records_sync_changes(self):
+        """
+            Ensure imported rows are returned by the next sync.
+        """
+        token = self.client.get(reverse('sync')).data['token']
+        self.import_file('advices.jsonl', self.record('a', 'Porada', ['rondo'], ['P1', 'P2']))
+        data = self.client.get(reverse('sync'), {'since': token}).data
+        self.assertEqual([advice['title'] for advice in data['advices']], ['Porada'])
+        self.assertEqual([tag['name'] for tag in data['tags']], ['rondo'])
+        self.assertEqual(len(data['test_questions']), 2)
+
+    def test_import_csv(self):
+        """
+            Ensure CSV rows of one advice are grouped into one advice with its questions.
+        """
+        self.import_file('advices.csv', (
+            'key,title,text,test_points,tags,question_text,answer_a,answer_b,answer_c,correct_answer\n'
+            'k1,Rondo,Tekst,3,rondo|noc,P1,a,b,c,a\n'
+            'k1,,,,,P2,a,b,c,c\n'
+            'k2,Mgła,Tekst,1,,P1,a,b,c,b\n'
+        ))
+        self.assertEqual(Advice.objects.get(import_key='k1').testquestions_set.count(), 2)
+        self.assertEqual(Advice.objects.get(import_key='k2').tags.count(), 0)
+
+    def test_invalid_record(self):
+        """
+            Ensure an invalid record stops the import with its line number.
+        """
+        with self.assertRaisesMessage(CommandError, 'Line 2: test_points is not a number'):
+            self.import_file('advices.jsonl', '\n'.join([
+                self.record('a', 'Porada', [], []),
+                json.dumps({'key': 'b', 'title': 'Porada', 'text': 'Tekst', 'test_points': 'x'}),
+            ]))
+
+    def test_invalid_csv_record_line(self):
+        """
+            Ensure an invalid CSV advice is reported with the line of its first row.
+        """
+        with self.assertRaisesMessage(CommandError, 'Line 3: test_points is not a number'):
+            self.import_file('advices.csv', (
+                'key,title,text,test_points,tags,question_text,answer_a,answer_b,answer_c,correct_answer\n'
+                'k1,Rondo,Tekst,3,,P1,a,b,c,a\n'
+                'k2,Mgła,Tekst,x,,P1,a,b,c,b\n'
+                'k2,,,,,P2,a,b,c,c\n'
+                'k3,Noc,Tekst,1,,P1,a,b,c,a\n'
+            ))
+
+    def test_csv_key_repeated_later(self):
+        """
+            Ensure a CSV key coming back after other keys stops the import instead of dropping rows.
+        """
+        with self.assertRaisesMessage(CommandError, 'Line 4: key k1 continues the advice of line 2'):
+            self.import_file('advices.csv', (
+                'key,title,text,test_points,tags,question_text,answer_a,answer_b,answer_c,correct_answer\n'
+                'k1,Rondo,Tekst,3,,P1,a,b,c,a\n'
+                'k2,Mgła,Tekst,1,,P1,a,b,c,b\n'
+                'k1,,,,,P2,a,b,c,c\n'
+            ))
+
+    def test_reimport_keeps_questions_added_by_hand(self):
+        """
+            Ensure a repeated import deletes only imported questions missing from the file.
+        """
+        self.import_file('advices.jsonl', self.record('a', 'Porada', [], ['P1', 'P2']))
+        advice = Advice.objects.get()
+        TestQuestions.objects.create(advice=advice, question_text='ręczne', answer_a='a', answer_b='b',
+                                     answer_c='c', correct_answer='a')
+        self.import_file('advices.jsonl', self.record('a', 'Porada', [], ['P1']))
+        self.assertEqual(sorted(advice.testquestions_set.values_list('question_text', flat=True)),
+                         ['P1', 'ręczne'])
+
+    def test_invalid_record_types(self):
+        """
+            Ensure values of wrong types stop the import instead of crashing it.
+        """
+        record = json.loads(self.record('a', 'Porada', ['rondo'], ['P1']))
+        for name, value, message in (
+                ('title', 5, 'title is not a string'),
+                ('tags', 'rondo', 'tags is not a list'),
+                ('tags', [['rondo']], "tag ['rondo'] is not a string"),
+                ('questions', ['P1'], 'question 1 is not an object'),
+                ('questions', [dict(record['questions'][0], correct_answer=1)], 'question 1 has a field'),
+                ('key', {'id': 1}, 'key is not a string or a number')):
+            with self.subTest(name=name, value=value), \
+                    self.assertRaisesMessage(CommandError, 'Line 1: %s' % message):
+                self.import_file('advices.jsonl', json.dumps(dict(record, **{name: value})))
+        self.assertFalse(Advice.objects.exists())
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        registry.reset()
+        Advice.objects.create(title="test", text='test', test_points=0)
+
+    def test_metrics_per_endpoint(self):
+        """
+            Ensure requests are counted per URL name with latency, queries and size.
+        """
+        for _ in range(2):
+            advices = self.client.get(reverse('advices'), format='json')
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                       if not line.startswith('#'))
+        labels = 'endpoint="advices",method="GET"'
+        self.assertEqual(samples['drive_safe_requests_total{%s,status="200"}' % labels], '2')
+        self.assertEqual(samples['drive_safe_request_duration_seconds_count{%s}' % labels], '2')
+        self.assertEqual(samples['drive_safe_request_duration_seconds_bucket{%s,le="+Inf"}' % labels], '2')
+        self.assertGreater(float(samples['drive_safe_db_queries_total{%s}' % labels]), 0)
+        self.assertEqual(float(samples['drive_safe_response_bytes_total{%s}' % labels]),
+                         2 * len(advices.content))
+        self.assertIn('drive_safe_requests_total{endpoint="unmatched",method="GET",status="404"}', samples)
+
+    def test_metrics_token(self):
+        """
+            Ensure a configured token is required to read metrics.
+        """
+        with self.settings(DRIVE_SAFE_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        Advice.objects.create(title="test", text='test', test_points=0)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def profile_settings(self, **kwargs):
+        options = {
+            'DRIVE_SAFE_PROFILING': True,
+            'DRIVE_SAFE_PROFILING_TOKEN': 'secret',
+            'DRIVE_SAFE_PROFILING_SAMPLE_RATE': 0,
+            'DRIVE_SAFE_PROFILING_DIR': self.directory,
+        }
+        options.update(kwargs)
+        return self.settings(**options)
+
+    def test_profile_with_token(self):
+        """
+            Ensure a request with the profiling token writes its profile and query trace.
+        """
+        with self.profile_settings():
+            response = self.client.get(reverse('advices'), HTTP_X_DRIVE_SAFE_PROFILE='secret')
+        profile_id = response['X-Drive-Safe-Profile-Id']
+        pstats.Stats(os.path.join(self.directory, profile_id + '.prof'))
+        with open(os.path.join(self.directory, profile_id + '.json')) as trace_file:
+            trace = json.load(trace_file)
+        self.assertEqual(trace['endpoint'], 'advices')
+        self.assertEqual(trace['status'], 200)
+        self.assertEqual(trace['query_count'], len(trace['queries']))
+        self.assertIn('drive_safe_advice', trace['queries'][0]['sql'])
+
+    def test_not_profiled(self):
+        """
+            Ensure requests without the token are not profiled at zero sample rate
+            or with profiling disabled.
+        """
+        with self.profile_settings():
+            response = self.client.get(reverse('advices'), HTTP_X_DRIVE_SAFE_PROFILE='wrong')
+            self.assertNotIn('X-Drive-Safe-Profile-Id', response)
+        with self.profile_settings(DRIVE_SAFE_PROFILING=False, DRIVE_SAFE_PROFILING_SAMPLE_RATE=1):
+            response = self.client.get(reverse('advices'), HTTP_X_DRIVE_SAFE_PROFILE='secret')
+            self.assertNotIn('X-Drive-Safe-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampled_profile(self):
+        """
+            Ensure sampled requests are profiled without the token.
+        """
+        with self.profile_settings(DRIVE_SAFE_PROFILING_SAMPLE_RATE=1):
+            response = self.client.get(reverse('advices'))
+        self.assertIn('X-Drive-Safe-Profile-Id', response)
+
+
+class SchemaTests(APITestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = self.settings(DRIVE_SAFE_SCHEMA_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_schemas()
+        self.addCleanup(reset_schemas)
+
+    def test_serve_stored_schema(self):
+        """
+            Ensure swagger.json serves the generated file with an ETag.
+        """
+        call_command('generate_schema', format=['.json'], stdout=StringIO())
+        with open(schema_path('.json'), 'rb') as schema_file:
+            content = schema_file.read()
+        self.assertIn(b'/advices/', content)
+        url = reverse('schema-json', kwargs={'format': '.json'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_check_detects_drift(self):
+        """
+            Ensure generate_schema --check fails for a missing or outdated schema.
+        """
+        with self.assertRaises(CommandError):
+            call_command('generate_schema', check=True, format=['.json'], stdout=StringIO())
+        call_command('generate_schema', format=['.json'], stdout=StringIO())
+        call_command('generate_schema', check=True, format=['.json'], stdout=StringIO())
+        with open(schema_path('.json'), 'ab') as schema_file:
+            schema_file.write(b' ')
+        with self.assertRaises(CommandError):
+            call_command('generate_schema', check=True, format=['.json'], stdout=StringIO())
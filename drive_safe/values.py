@@ -0,0 +1,142 @@
+"""
+Read-only serialization straight from values() rows.
+
+ValuesSerializer gives the same output as a ModelSerializer with many=True
+without creating model instances, and only calls to_representation for
+fields whose database value isn't already its JSON form (dates and times).
+Nested many-to-many serializers (depth = 1) are filled from one extra query.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+# fields whose representation equals the value read from the database
+PLAIN_FIELDS = (serializers.BooleanField, serializers.CharField, serializers.IntegerField,
+                PrimaryKeyRelatedField)
+CONVERTED_FIELDS = (serializers.DateField, serializers.DateTimeField)
+
+
+class ValuesSerializer:
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.field_names = fields
+        self._sparse = {}
+
+    def sparse(self, fields):
+        """
+        Return a ValuesSerializer limited to given field names, see
+        serializers.SparseFieldsMixin.
+        """
+        key = frozenset(fields)
+        if key not in self._sparse:
+            self._sparse[key] = ValuesSerializer(self.serializer_class, fields=key)
+        return self._sparse[key]
+
+    @cached_property
+    def fields(self):
+        """
+        List of (name, source, to_representation or None, nested) of the
+        serializer fields, where nested is (query name, ValuesSerializer)
+        for nested many-to-many serializers.
+        """
+        if self.field_names is None:
+            serializer = self.serializer_class()
+        else:
+            serializer = self.serializer_class(fields=self.field_names)
+        fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured('%s.%s has an unsupported source %r' % (
+                    self.serializer_class.__name__, name, field.source))
+            if isinstance(field, serializers.ListSerializer):
+                model_field = self.model._meta.get_field(field.source)
+                if not model_field.many_to_many or not isinstance(
+                        field.child, serializers.ModelSerializer):
+                    raise ImproperlyConfigured('%s.%s is not a nested many-to-many serializer' % (
+                        self.serializer_class.__name__, name))
+                nested = (model_field.related_query_name(), ValuesSerializer(type(field.child)))
+                fields.append((name, field.source, None, nested))
+            elif isinstance(field, PLAIN_FIELDS):
+                fields.append((name, field.source, None, None))
+            elif isinstance(field, CONVERTED_FIELDS):
+                fields.append((name, field.source, field.to_representation, None))
+            else:
+                raise ImproperlyConfigured('%s.%s can not be read from values()' % (
+                    self.serializer_class.__name__, name))
+        return fields
+
+    @cached_property
+    def columns(self):
+        pk_name = self.model._meta.pk.name
+        columns = [source for _, source, _, nested in self.fields if nested is None]
+        if pk_name not in columns:
+            columns.append(pk_name)
+        return columns
+
+    def values(self, queryset, extra_columns=()):
+        """
+        Return the queryset as dicts of the columns needed by
+        to_representation and extra columns, e.g. the pagination ordering.
+        """
+        columns = list(self.columns)
+        columns.extend(column.lstrip('-') for column in extra_columns
+                       if column.lstrip('-') not in columns)
+        return queryset.prefetch_related(None).values(*columns)
+
+    def only(self, queryset):
+        """
+        Limit a queryset of model instances to the columns of the fields.
+        """
+        queryset = queryset.only(*self.columns)
+        if not self.nested_fields:
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def to_representation(self, rows, using=None):
+        """
+        Serialize rows of values() into a list of dicts, reading nested rows
+        from the using database or the one picked by the routers.
+        """
+        pk_name = self.model._meta.pk.name
+        nested_data = {
+            name: self.get_nested(query_name, serializer, [row[pk_name] for row in rows], using)
+            for name, _, _, (query_name, serializer) in self.nested_fields
+        }
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, to_representation, nested in self.fields:
+                if nested is not None:
+                    item[name] = nested_data[name].get(row[pk_name], [])
+                else:
+                    value = row[source]
+                    if to_representation is not None and value is not None:
+                        value = to_representation(value)
+                    item[name] = value
+            data.append(item)
+        return data
+
+    @cached_property
+    def nested_fields(self):
+        return [field for field in self.fields if field[3] is not None]
+
+    @staticmethod
+    def get_nested(query_name, serializer, pks, using=None):
+        """
+        Return a dict mapping pks of the parent rows to serialized related rows.
+        """
+        if not pks:
+            return {}
+        related = serializer.model._default_manager.db_manager(using).filter(**{'%s__in' % query_name: pks})
+        grouped = defaultdict(list)
+        for row in related.values(*serializer.columns, parent_pk=F(query_name)):
+            grouped[row['parent_pk']].append(row)
+        return {pk: serializer.to_representation(group) for pk, group in grouped.items()}
@@ -1,8 +1,32 @@
-from django.http import Http404, JsonResponse
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+from psycopg2 import errorcodes
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework import status
+from drive_safe.cache import (ADVICE_LIST_GENERATION_KEY, FORUM_ANSWERS_VERSION_KEY, FORUM_QUESTIONS_VERSION_KEY,
+                              TAG_LIST_KEY, advice_key, advice_list_key, advice_test_key, cached, state_key)
+from drive_safe.conditional import (collection_state, conditional_get, object_related_state, object_state,
+                                    queryset_state)
+from drive_safe.filters import AdviceTagFilterBackend, ForumFilterBackend
+from drive_safe.grading import GradingError, grade, load_answer_key
+from drive_safe.leaderboard import get_top_scores, score_ranking
+from drive_safe.metrics import registry
+from drive_safe.schema import SCHEMA_FORMATS, get_schema
+from drive_safe.search import SEARCH_MODELS, search
 from drive_safe.serializers import *
+from drive_safe.streaming import streaming_response, wants_stream
+from drive_safe.sync import get_changes
+from drive_safe.values import ValuesSerializer
 from django.contrib.auth.models import User
 
 
@@ -14,46 +38,187 @@ def get_user(user_id):
     return user
 
 
-def get_advice_object(advice_id):
+def get_advice_object(advice_id, queryset=None):
+    if queryset is None:
+        queryset = Advice.objects.all()
     try:
-        return Advice.objects.get(pk=advice_id)
+        return queryset.get(pk=advice_id)
     except Advice.DoesNotExist:
         raise Http404
 
 
-def get_forum_question_object(question_id):
+def is_unique_violation(error, model):
+    """
+    Return whether the IntegrityError violates a unique constraint of the
+    table of model.
+    """
+    cause = error.__cause__
+    return (getattr(cause, 'pgcode', None) == errorcodes.UNIQUE_VIOLATION
+            and cause.diag.table_name == model._meta.db_table)
+
+
+def get_forum_question_object(question_id, queryset=None):
+    if queryset is None:
+        queryset = ForumQuestion.objects.all()
     try:
-        return ForumQuestion.objects.get(pk=question_id)
+        return queryset.get(pk=question_id)
     except ForumQuestion.DoesNotExist:
         raise Http404
 
 
+def get_requested_ids(request):
+    """
+    Return the distinct ids given as ?ids=1,5,9 in their order, or None.
+    """
+    value = request.query_params.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = list(OrderedDict.fromkeys(int(advice_id) for advice_id in value.split(',')))
+    except ValueError:
+        raise ValidationError({'ids': 'A comma separated list of integers is required.'})
+    max_ids = getattr(settings, 'DRIVE_SAFE_MAX_BATCH_IDS', 100)
+    if len(ids) > max_ids:
+        raise ValidationError({'ids': 'At most %d ids can be requested at once.' % max_ids})
+    return ids
+
+
+def get_values_serializer(request, values_serializer):
+    """
+    Return values_serializer limited to the fields chosen with ?fields=a,b
+    or ?exclude=a,b.
+    """
+    fields = request.query_params.get('fields')
+    exclude = request.query_params.get('exclude')
+    if not fields and not exclude:
+        return values_serializer
+
+    available = [field[0] for field in values_serializer.fields]
+    selected = [name.strip() for name in fields.split(',')] if fields else available
+    excluded = [name.strip() for name in exclude.split(',')] if exclude else []
+    unknown = set(selected + excluded) - set(available)
+    if unknown:
+        raise ValidationError({'fields': 'Unknown fields: %s' % ', '.join(sorted(unknown))})
+    return values_serializer.sparse(name for name in selected if name not in excluded)
+
+
+def list_values(view, queryset):
+    """
+    Return the serialized page of the queryset, read with values() and
+    limited to the chosen fields.
+    """
+    values_serializer = get_values_serializer(view.request, view.values_serializer)
+    ordering = getattr(view, 'ordering', None) or view.paginator.ordering
+    rows = view.paginate_queryset(values_serializer.values(queryset, ordering))
+    return values_serializer.to_representation(rows)
+
+
+def update_pass_counts(rows):
+    """
+    Replace pass counts of the advice rows of a cached list with the current
+    ones, which passed tests change without invalidating the lists, and
+    return them. Uses one query.
+    """
+    rows = [row for row in rows if 'pass_count' in row and 'id' in row]
+    if not rows:
+        return ()
+    pass_counts = dict(Advice.objects.filter(pk__in=[row['id'] for row in rows]).values_list(
+        'id', 'pass_count'))
+    for row in rows:
+        row['pass_count'] = pass_counts.get(row['id'], row['pass_count'])
+    return tuple(row['pass_count'] for row in rows)
+
+
 class AdviceList(GenericAPIView):
     """
-    Return list of all advices sorted by creation date.
+    Return a page of advices sorted by creation date, optionally filtered
+    by tags with ?tags=1,2,3&match=any|all, or advices with ids given as
+    ?ids=1,5,9 in that order, with the ids that were not found.
     """
 
     serializer_class = AdviceSerializer
-    queryset = Advice.objects.all().order_by("date_added")
-
+    values_serializer = ValuesSerializer(AdviceSerializer)
+    queryset = Advice.objects.prefetch_related("tags").order_by("date_added", "id")
+    filter_backends = (AdviceTagFilterBackend,)
+    cache_control = 'advices'
+
+    def get_state(self, request):
+        ids = get_requested_ids(request)
+        if ids is None:
+            queryset = self.filter_queryset(self.get_queryset())
+        else:
+            queryset = Advice.objects.filter(pk__in=ids)
+        key = advice_list_key(request)
+        parts, last_modified = cached(state_key(key), lambda: queryset_state(queryset),
+                                      ADVICE_LIST_GENERATION_KEY)
+        if ids is None:
+            self.page = cached(key, self.list_advices, ADVICE_LIST_GENERATION_KEY)
+        else:
+            self.page = cached(key, lambda: self.fetch_advices(ids), ADVICE_LIST_GENERATION_KEY)
+        return (parts, update_pass_counts(self.page['results'])), last_modified
+
+    @conditional_get
     def get(self, request, format=None):
-        advices = self.get_queryset()
-        serializer = self.serializer_class(advices, many=True)
-        return Response(serializer.data)
+        return Response(self.page)
+
+    def list_advices(self):
+        data = list_values(self, self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(data).data
+
+    def fetch_advices(self, ids):
+        values_serializer = get_values_serializer(self.request, self.values_serializer)
+        rows = values_serializer.values(self.get_queryset().filter(pk__in=ids).order_by())
+        found = {row['id']: row for row in rows}
+        return OrderedDict([
+            ('results', values_serializer.to_representation(
+                [found[advice_id] for advice_id in ids if advice_id in found])),
+            ('missing', [advice_id for advice_id in ids if advice_id not in found]),
+        ])
 
 
 class AdviceTagList(GenericAPIView):
     """
-    Return list of advices matching to given tag id.
+    Return a page of advices matching to given tag id.
     """
 
     serializer_class = AdviceSerializer
-    queryset = Advice.objects.all()
-
+    values_serializer = ValuesSerializer(AdviceSerializer)
+    queryset = Advice.objects.prefetch_related("tags")
+    cache_control = 'advices'
+
+    def get_state(self, request, tag_id):
+        key = advice_list_key(request)
+        parts, last_modified = cached(state_key(key),
+                                      lambda: queryset_state(Advice.objects.filter(tags=tag_id)),
+                                      ADVICE_LIST_GENERATION_KEY)
+        self.page = cached(key, lambda: self.list_advices(tag_id), ADVICE_LIST_GENERATION_KEY)
+        return (parts, update_pass_counts(self.page['results'])), last_modified
+
+    @conditional_get
     def get(self, request, tag_id, format=None):
-        advices = self.get_queryset().filter(tags=tag_id)
-        serializer = self.serializer_class(advices, many=True)
-        return Response(serializer.data)
+        return Response(self.page)
+
+    def list_advices(self, tag_id):
+        data = list_values(self, self.get_queryset().filter(tags=tag_id))
+        return self.get_paginated_response(data).data
+
+
+class TagList(GenericAPIView):
+    """
+    Return all tags sorted by name with the number of their advices.
+    """
+
+    serializer_class = TagCountSerializer
+    values_serializer = ValuesSerializer(TagCountSerializer)
+    queryset = Tags.objects.annotate(advice_count=Count('advice')).order_by('name', 'id')
+    pagination_class = None
+
+    def get(self, request, format=None):
+        return Response(cached(TAG_LIST_KEY, self.list_tags))
+
+    def list_tags(self):
+        return self.values_serializer.to_representation(
+            list(self.values_serializer.values(self.get_queryset())))
 
 
 class AdviceDetail(GenericAPIView):
@@ -62,11 +227,27 @@ class AdviceDetail(GenericAPIView):
     """
 
     serializer_class = AdviceSerializer
+    values_serializer = ValuesSerializer(AdviceSerializer)
+    queryset = Advice.objects.prefetch_related("tags")
+    cache_control = 'advices'
+
+    def get_state(self, request, advice_id):
+        # pass_count changes without updated_at, see drive_safe.counters
+        return cached(state_key(advice_key(advice_id)),
+                      lambda: object_state(Advice.objects.all(), int(advice_id), 'pass_count'))
 
+    @conditional_get
     def get(self, request, advice_id, format=None):
-        advice = get_advice_object(advice_id)
-        serializer = self.serializer_class(advice)
-        return Response(serializer.data)
+        values_serializer = get_values_serializer(request, self.values_serializer)
+        if values_serializer is not self.values_serializer:
+            # only full advices are cached, invalidation doesn't know other variants
+            return Response(self.retrieve_advice(advice_id, values_serializer))
+        return Response(cached(advice_key(advice_id),
+                               lambda: self.retrieve_advice(advice_id, values_serializer)))
+
+    def retrieve_advice(self, advice_id, values_serializer):
+        advice = get_advice_object(advice_id, values_serializer.only(self.get_queryset()))
+        return self.serializer_class(advice, fields=values_serializer.field_names).data
 
 
 class AdviceTest(GenericAPIView):
@@ -76,12 +257,21 @@ class AdviceTest(GenericAPIView):
 
     serializer_class = TestQuestionsSerializer
     queryset = ''
+    cache_control = 'advices'
 
+    def get_state(self, request, advice_id):
+        return cached(state_key(advice_test_key(advice_id)),
+                      lambda: queryset_state(TestQuestions.objects.filter(advice=advice_id)))
+
+    @conditional_get
     def get(self, request, advice_id, format=None):
+        return Response(cached(advice_test_key(advice_id),
+                               lambda: self.list_questions(advice_id)))
+
+    def list_questions(self, advice_id):
         advice = get_advice_object(advice_id)
         test_questions = advice.testquestions_set.all()
-        serializer = self.serializer_class(test_questions, many=True)
-        return Response(serializer.data)
+        return self.serializer_class(test_questions, many=True).data
 
 
 class TestCheck(GenericAPIView):
@@ -102,74 +292,111 @@ class TestCheck(GenericAPIView):
                 return JsonResponse({'error message': 'Test already passed'},
                                     status=status.HTTP_400_BAD_REQUEST)
 
-            test_questions = advice.testquestions_set.all()
-            number_of_questions = len(test_questions)
-            number_of_answers = len(serializer.validated_data)
-            if not number_of_questions == number_of_answers:
-                return JsonResponse({'message': 'Wrong number of answers'},
+            try:
+                incorrect_answers = grade(load_answer_key(advice),
+                                          serializer.validated_data)
+            except GradingError as error:
+                return JsonResponse({'message': str(error)},
                                     status=status.HTTP_400_BAD_REQUEST)
 
-            number_of_correct_answers = 0
-            incorrect_answers = {'incorrect_answers': []}
-            for element in serializer.validated_data:
-                question_id = element['question_id']
-                user_answer = element['question_answer']
+            if not incorrect_answers:
                 try:
-                    # check if this question belong to this test
-                    question = test_questions.get(
-                        id=question_id)
-                    # remove once checked question from question pool
-                    test_questions = test_questions.exclude(
-                        id=question_id)
-                except TestQuestions.DoesNotExist:
+                    test_passed = TestCheck.record_test_passed(user, advice)
+                except IntegrityError as error:
+                    if not is_unique_violation(error, TestPassed):
+                        raise
+                    # a concurrent submission has already passed this test
                     return JsonResponse(
-                        {'message': 'Question does not belong to the test'},
+                        {'error message': 'Test already passed'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
-                correct_answer = question.correct_answer
-                if correct_answer.upper() == user_answer.upper():
-                    number_of_correct_answers += 1
-                else:
-                    incorrect_answers["incorrect_answers"].append(question_id)
-
-            if number_of_correct_answers == number_of_questions:
-                TestCheck.add_points_to_user(user, advice)
-                test_passed = TestPassed.objects.create(user=user,
-                                                        advice=advice)
                 result_serializer = TestPassedSerializer(test_passed)
                 return Response(result_serializer.data,
                                 status=status.HTTP_201_CREATED)
             else:
-                result_serializer = TestFailedSerializer(incorrect_answers)
+                result_serializer = TestFailedSerializer(
+                    {'incorrect_answers': incorrect_answers})
                 return Response(result_serializer.data,
                                 status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def record_test_passed(user, advice):
+        """
+        Record the passed test and add its points in one short transaction.
+        The unique (user, advice) constraint rejects a second pass with
+        IntegrityError, which rolls the points back as well.
+        """
+        with transaction.atomic():
+            test_passed = TestPassed.objects.create(user=user, advice=advice)
+            new_score = TestCheck.add_points_to_user(user, advice)
+        if new_score is None:
+            score_ranking.score_added(advice.test_points)
+        else:
+            score_ranking.score_changed(new_score - advice.test_points, new_score)
+        return test_passed
+
     @staticmethod
     def add_points_to_user(user, advice):
+        """
+        Return the new score or None if the user had no score before.
+        """
         points_to_add = advice.test_points
-        user_score_instance = user.user_score
-        user_score_instance.score += points_to_add
-        user_score_instance.save()
-        return None
+        user_scores = UserScore.objects.filter(user=user)
+        created = False
+        # increment in the database, so concurrent updates are not lost
+        if not user_scores.update(score=F('score') + points_to_add):
+            created = TestCheck.create_user_score(user)
+            user_scores.update(score=F('score') + points_to_add)
+        # the row stays locked until commit, so this is our own result
+        new_score = user_scores.values_list('score', flat=True).get()
+        return None if created else new_score
+
+    @staticmethod
+    def create_user_score(user):
+        """
+        Create a zero score row of the user unless a concurrent first pass of
+        another test has created it, return whether it was created here. A
+        unique violation would roll back the pass being recorded.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO %s (user_id, score) VALUES (%%s, 0) ON CONFLICT (user_id) DO NOTHING'
+                % connection.ops.quote_name(UserScore._meta.db_table), [user.pk])
+            return cursor.rowcount == 1
 
 
 class ForumQuestionList(GenericAPIView):
     """
     get:
-    Return a list of all forum questions.
+    Return a page of forum questions sorted by creation date, or all of them
+    streamed as a JSON array with ?stream=true. Filtered by advice and user ids
+    and by date_from / date_to.
 
     post:
     Create a new forum question instance.
     """
 
     serializer_class = ForumQuestionsSerializer
+    values_serializer = ValuesSerializer(ForumQuestionsSerializer)
     queryset = ForumQuestion.objects.all()
+    filter_backends = (ForumFilterBackend,)
+    filter_fields = ('advice', 'user')
+    cache_control = 'forum'
 
+    def get_state(self, request):
+        return collection_state(FORUM_QUESTIONS_VERSION_KEY, ForumQuestion)
+
+    @conditional_get
     def get(self, request, format=None):
-        forum_questions = self.get_queryset()
-        serializer = self.serializer_class(forum_questions, many=True)
-        return Response(serializer.data)
+        if wants_stream(request):
+            values_serializer = get_values_serializer(request, self.values_serializer)
+            return streaming_response(
+                values_serializer.only(
+                    self.filter_queryset(self.get_queryset()).order_by('date_added', 'id')),
+                partial(self.serializer_class, fields=values_serializer.field_names))
+        return self.get_paginated_response(
+            list_values(self, self.filter_queryset(self.get_queryset())))
 
     def post(self, request, format=None):
         serializer = self.serializer_class(data=request.data)
@@ -192,10 +419,18 @@ class ForumQuestionDetail(GenericAPIView):
     """
 
     serializer_class = ForumQuestionsSerializer
+    values_serializer = ValuesSerializer(ForumQuestionsSerializer)
+    cache_control = 'forum'
 
+    def get_state(self, request, question_id):
+        return object_state(ForumQuestion.objects.all(), int(question_id))
+
+    @conditional_get
     def get(self, request, question_id, format=None):
-        forum_question = get_forum_question_object(question_id)
-        serializer = self.serializer_class(forum_question)
+        values_serializer = get_values_serializer(request, self.values_serializer)
+        forum_question = get_forum_question_object(
+            question_id, values_serializer.only(ForumQuestion.objects.all()))
+        serializer = self.serializer_class(forum_question, fields=values_serializer.field_names)
         return Response(serializer.data)
 
     def put(self, request, question_id, format=None):
@@ -213,22 +448,69 @@ class ForumQuestionDetail(GenericAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ForumThread(GenericAPIView):
+    """
+    Return a forum question with a page of its answers sorted by creation
+    date and summaries of their authors.
+    """
+
+    serializer_class = ForumThreadSerializer
+    queryset = ''
+    cache_control = 'forum'
+
+    def get_state(self, request, question_id):
+        return object_related_state(ForumQuestion.objects.all(), int(question_id),
+                                    ForumAnswers, 'question')
+
+    @conditional_get
+    def get(self, request, question_id, format=None):
+        forum_question = get_forum_question_object(
+            question_id, ForumQuestion.objects.select_related('user'))
+        forum_answers = self.paginate_queryset(
+            forum_question.forumanswers_set.select_related('user'))
+
+        users = {forum_question.user_id: forum_question.user}
+        users.update((answer.user_id, answer.user) for answer in forum_answers)
+        answers = ForumAnswersSerializer(forum_answers, many=True).data
+        serializer = self.serializer_class({
+            'question': forum_question,
+            'answers': self.paginator.get_paginated_response(answers).data,
+            'users': list(users.values()),
+        })
+        return Response(serializer.data)
+
+
 class ForumAnswersList(GenericAPIView):
     """
     get:
-    Return a list of all forum answers
+    Return a page of forum answers sorted by creation date, or all of them
+    streamed as a JSON array with ?stream=true. Filtered by question and user ids
+    and by date_from / date_to.
 
     post:
     Create a new forum answer instance.
     """
 
     serializer_class = ForumAnswersSerializer
+    values_serializer = ValuesSerializer(ForumAnswersSerializer)
     queryset = ForumAnswers.objects.all()
+    filter_backends = (ForumFilterBackend,)
+    filter_fields = ('question', 'user')
+    cache_control = 'forum'
 
+    def get_state(self, request):
+        return collection_state(FORUM_ANSWERS_VERSION_KEY, ForumAnswers)
+
+    @conditional_get
     def get(self, request, format=None):
-        forum_answers = self.get_queryset()
-        serializer = self.serializer_class(forum_answers, many=True)
-        return Response(serializer.data)
+        if wants_stream(request):
+            values_serializer = get_values_serializer(request, self.values_serializer)
+            return streaming_response(
+                values_serializer.only(
+                    self.filter_queryset(self.get_queryset()).order_by('date_added', 'id')),
+                partial(self.serializer_class, fields=values_serializer.field_names))
+        return self.get_paginated_response(
+            list_values(self, self.filter_queryset(self.get_queryset())))
 
     def post(self, request, format=None):
         serializer = self.serializer_class(data=request.data)
@@ -240,17 +522,22 @@ class ForumAnswersList(GenericAPIView):
 
 class ForumAnswersForQuestion(GenericAPIView):
     """
-    Return a list of forum answers for given forum question id
+    Return a page of forum answers for given forum question id
     """
 
     serializer_class = ForumAnswersSerializer
+    values_serializer = ValuesSerializer(ForumAnswersSerializer)
     queryset = ''
+    cache_control = 'forum'
 
+    def get_state(self, request, question_id):
+        return queryset_state(ForumAnswers.objects.filter(question=question_id))
+
+    @conditional_get
     def get(self, request, question_id, format=None):
         forum_question = get_forum_question_object(question_id)
-        forum_answers = forum_question.forumanswers_set.all()
-        serializer = self.serializer_class(forum_answers, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(
+            list_values(self, forum_question.forumanswers_set.all()))
 
 
 class ForumAnswersDetail(GenericAPIView):
@@ -266,16 +553,25 @@ class ForumAnswersDetail(GenericAPIView):
         """
 
     serializer_class = ForumAnswersSerializer
+    values_serializer = ValuesSerializer(ForumAnswersSerializer)
+    cache_control = 'forum'
 
-    def get_answer_object(self, id):
+    def get_answer_object(self, id, queryset=None):
+        if queryset is None:
+            queryset = ForumAnswers.objects.all()
         try:
-            return ForumAnswers.objects.get(pk=id)
+            return queryset.get(pk=id)
         except ForumAnswers.DoesNotExist:
             raise Http404
 
+    def get_state(self, request, answer_id):
+        return object_state(ForumAnswers.objects.all(), int(answer_id))
+
+    @conditional_get
     def get(self, request, answer_id, format=None):
-        forum_answer = self.get_answer_object(answer_id)
-        serializer = self.serializer_class(forum_answer)
+        values_serializer = get_values_serializer(request, self.values_serializer)
+        forum_answer = self.get_answer_object(answer_id, values_serializer.only(ForumAnswers.objects.all()))
+        serializer = self.serializer_class(forum_answer, fields=values_serializer.field_names)
         return Response(serializer.data)
 
     def put(self, request, answer_id, format=None):
@@ -292,6 +588,62 @@ class ForumAnswersDetail(GenericAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class Search(GenericAPIView):
+    """
+    Full-text search of advices or forum questions, best matches first.
+
+    Query parameters: q - searched text, scope - "advices" (default)
+    or "forum_questions".
+    """
+
+    serializer_class = AdviceSerializer
+    ordering = ('-rank', 'id')
+    serializers = {
+        'advices': AdviceSerializer,
+        'forum_questions': ForumQuestionsSerializer,
+    }
+
+    def get(self, request, format=None):
+        text = request.query_params.get('q', '').strip()
+        scope = request.query_params.get('scope', 'advices')
+        if not text:
+            return Response({'q': ['This parameter is required.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if scope not in SEARCH_MODELS:
+            return Response({'scope': ['Choose one of: %s.' % ', '.join(SEARCH_MODELS)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = search(SEARCH_MODELS[scope].objects.all(), text)
+        if scope == 'advices':
+            queryset = queryset.prefetch_related('tags')
+        results = self.paginate_queryset(queryset)
+        serializer = self.serializers[scope](results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class Sync(GenericAPIView):
+    """
+    Return tags, advices and test questions created or changed since the
+    sync that returned the token given in ?since= (all of them without it)
+    and ids of the deleted ones. Sync again right away while more is true.
+    """
+
+    serializer_class = SyncSerializer
+    queryset = ''
+
+    def get(self, request, format=None):
+        since = request.query_params.get('since', '0')
+        try:
+            since = int(since)
+        except ValueError:
+            since = -1
+        if since < 0:
+            raise ValidationError({'since': 'A valid sync token is required.'})
+        limit = getattr(settings, 'DRIVE_SAFE_SYNC_LIMIT', 1000)
+        # already serialized from values() rows, serializer_class documents it
+        return Response(get_changes(since, limit))
+
+
 class UserRegistration(GenericAPIView):
     """
     Registration of a new user
@@ -303,11 +655,55 @@ class UserRegistration(GenericAPIView):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             new_user = serializer.save()
-            UserScore.objects.create(user=new_user)
+            user_score = UserScore.objects.create(user=new_user)
+            score_ranking.score_added(user_score.score)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class Leaderboard(GenericAPIView):
+    """
+    Return the best users with their ranks.
+
+    Query parameters: limit - number of users (10 by default, at most 100),
+    user_id - also return rank of this user as "me".
+    """
+
+    serializer_class = LeaderboardEntrySerializer
+    default_limit = 10
+    max_limit = 100
+
+    def get(self, request, format=None):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), self.max_limit)
+
+        top = [
+            self.get_entry(user_score.user, user_score.score, rank)
+            for user_score, rank in get_top_scores(limit)
+        ]
+        data = {'top': self.serializer_class(top, many=True).data}
+
+        user_id = request.query_params.get('user_id')
+        if user_id is not None:
+            try:
+                user_score = UserScore.objects.select_related('user').get(
+                    user_id=int(user_id))
+            except (ValueError, UserScore.DoesNotExist):
+                raise Http404
+            me = self.get_entry(user_score.user, user_score.score,
+                                score_ranking.rank(user_score.score))
+            data['me'] = self.serializer_class(me).data
+        return Response(data)
+
+    @staticmethod
+    def get_entry(user, score, rank):
+        return {'rank': rank, 'user_id': user.id, 'username': user.username,
+                'score': score}
+
+
 class GetUserInfo(GenericAPIView):
     """
     Return user id, username and user score with given user id
@@ -319,3 +715,32 @@ class GetUserInfo(GenericAPIView):
         user = get_user(user_id)
         serializer = self.serializer_class(user)
         return Response(serializer.data)
+
+
+def metrics(request):
+    """
+    Expose request metrics of this worker process in Prometheus text format.
+    When DRIVE_SAFE_METRICS_TOKEN is set it has to be sent as a bearer token.
+    """
+    token = getattr(settings, 'DRIVE_SAFE_METRICS_TOKEN', None)
+    if token and not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer %s' % token):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_safe
+def api_schema(request, format):
+    """
+    Serve the precomputed OpenAPI schema, see drive_safe.schema.
+    """
+    content, etag = get_schema(format)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        _, content_type = SCHEMA_FORMATS[format]
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    profiles = getattr(settings, 'DRIVE_SAFE_CACHE_CONTROL', {})
+    patch_cache_control(response, **profiles.get('schema', {}))
+    return response
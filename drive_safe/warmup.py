@@ -0,0 +1,72 @@
+"""
+Worker warm-up, run by Driver/wsgi.py when a worker process loads the
+application, so its first requests don't pay for connecting to the
+databases, importing the URLconf with the views and drf_yasg, building
+serializer fields, filling the per-process caches and loading the stored
+OpenAPI schema.
+
+Servers preloading the application before forking workers (gunicorn
+--preload) must call warm_up() from a post-fork hook instead: forked
+workers can't share database connections.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+from drive_safe.grading import preload_answer_keys
+from drive_safe.leaderboard import score_ranking
+from drive_safe.models import Advice
+from drive_safe.schema import SCHEMA_FORMATS, get_schema
+
+logger = logging.getLogger(__name__)
+
+
+def open_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def load_urls():
+    """
+    Import the URLconf, populate its reverse lookups and build the fields of
+    the serializers used by its views.
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        view_class = getattr(getattr(pattern, 'callback', None), 'cls', None)
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is not None:
+            serializer_class().fields
+        values_serializer = getattr(view_class, 'values_serializer', None)
+        if values_serializer is not None:
+            values_serializer.columns
+
+
+def fill_caches():
+    score_ranking.rank(0)
+    count = getattr(settings, 'DRIVE_SAFE_WARM_UP_ANSWER_KEYS', 0)
+    if count:
+        preload_answer_keys(list(Advice.objects.order_by('-pass_count', 'id').values_list(
+            'id', flat=True)[:count]))
+
+
+def load_schemas():
+    for format in SCHEMA_FORMATS:
+        get_schema(format)
+
+
+def warm_up():
+    """
+    Run the warm-up steps, logging failures instead of raising them: a
+    worker that failed to warm up still serves requests, only slower.
+    """
+    if not getattr(settings, 'DRIVE_SAFE_WARM_UP', False):
+        return
+    for step in (open_connections, load_urls, fill_caches, load_schemas):
+        try:
+            step()
+        except Exception:
+            logger.exception('Worker warm-up step %s failed', step.__name__)